@@ -0,0 +1,193 @@
+"""
+    End-to-end benchmark of the export against the local mock server.
+
+    Every scenario runs the complete `cli()` (headless, without the
+    attribute cache) in a fresh interpreter and reports the wall time of
+    the export, the amount of API requests and the peak memory (RSS).
+    The results can be saved and compared with a previous run to catch
+    regressions.
+
+    Usage:
+        python -m benchmarks.bench_end_to_end [--items 500] [--latency 0.005]
+            [--scenario all item variation] [--engine sync async]
+            [--save results.json] [--baseline results.json]
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import simplejson
+
+from benchmarks.mock_server import (add_server_arguments, server_settings,
+                                    start_server, PRIMARY_MARKET,
+                                    ALTERNATIVE_MARKET)
+
+RESULT_PREFIX = 'BENCH '
+# Tolerated slowdown against the baseline before a scenario fails
+TOLERANCE = 0.2
+
+
+def run_child(argv):
+    """
+        Run the export within this (child) process and report the wall
+        time and the peak memory on the last line of the output.
+    """
+    import keyring
+    import keyring.backends.fail
+    # Never touch the keyring of the user with tokens of the mock server
+    keyring.set_keyring(keyring.backends.fail.Keyring())
+    from plenty_attribute_export.cli import cli
+
+    sys.argv = ['plenty_attribute_export'] + argv
+    start = time.perf_counter()
+    cli()
+    wall = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform != 'darwin':
+        peak *= 1024
+    print(RESULT_PREFIX + simplejson.dumps({'wall': wall, 'peak': peak}))
+
+
+def write_config(directory, url, attributes):
+    path = os.path.join(directory, 'config.ini')
+    with open(path, mode='w') as config_file:
+        config_file.write(
+            "[PLENTY]\nurl = {0}\nattribute_ids = {1}\n"
+            "primary_market_id = {2}\nalternative_market_id = {3}\n"
+            .format(url, ','.join(str(attribute) for attribute in
+                                  range(1, attributes + 1)),
+                    PRIMARY_MARKET, ALTERNATIVE_MARKET))
+    return path
+
+
+def scenario_arguments(name, server, size):
+    """
+        Parameter:
+            name [String]   : all/item/variation
+            server [MockServer]
+            size [Int]      : Amount of items/variations of the list scopes
+
+        Return:
+            [List] : Command line arguments of the scope
+    """
+    if name == 'all':
+        return ['-s', 'all']
+    variations = [variation for variation in server.catalogue.variations
+                  if not variation['isMain']]
+    if name == 'item':
+        items = sorted({variation['itemId'] for variation in variations})
+        return ['-s', 'item', '-i',
+                ','.join(str(item) for item in items[:size])]
+    step = max(len(variations) // size, 1)
+    return ['-s', 'variation', '-v',
+            ','.join(str(variation['id']) for variation in
+                     variations[::step][:size])]
+
+
+def run_scenario(server, directory, config, name, engine, args):
+    output = os.path.join(directory, str(f'{name}_{engine}.csv'))
+    argv = scenario_arguments(name=name, server=server, size=args.size) + [
+        '--headless', '--config-file', config, '--output', output,
+        '--no-cache', '--engine', engine, '-w', str(args.workers),
+        '--items-per-page', str(args.items_per_page)]
+    env = dict(os.environ, PLENTY_USERNAME='bench', PLENTY_PASSWORD='bench')
+    server.reset_counts()
+    process = subprocess.run(
+        [sys.executable, '-m', 'benchmarks.bench_end_to_end', '--child',
+         '--'] + argv, env=env, capture_output=True, text=True)
+    results = [line for line in process.stdout.splitlines()
+               if line.startswith(RESULT_PREFIX)]
+    if process.returncode != 0 or not results:
+        print(process.stdout[-2000:], process.stderr[-2000:])
+        raise RuntimeError(str(f'scenario {name}/{engine} failed'))
+    result = simplejson.loads(results[-1][len(RESULT_PREFIX):])
+    with open(output, mode='r') as output_file:
+        result['rows'] = sum(1 for _ in output_file) - 1
+    result['requests'] = sum(server.counts.values())
+    result['endpoints'] = dict(server.counts)
+    return result
+
+
+def compare(results, baseline):
+    """
+        Return:
+            [List] : Descriptions of the regressions against the baseline
+    """
+    regressions = []
+    for key, result in results.items():
+        previous = baseline.get(key)
+        if not previous:
+            continue
+        if result['wall'] > previous['wall'] * (1 + TOLERANCE):
+            regressions.append(str(
+                f"{key}: wall time {previous['wall']:.2f}s -> "
+                f"{result['wall']:.2f}s"))
+        if result['requests'] > previous['requests']:
+            regressions.append(str(
+                f"{key}: requests {previous['requests']} -> "
+                f"{result['requests']}"))
+    return regressions
+
+
+def main():
+    if '--child' in sys.argv:
+        run_child(argv=sys.argv[sys.argv.index('--') + 1:])
+        return
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    add_server_arguments(parser)
+    parser.add_argument('--scenario', nargs='+', default=['all', 'item',
+                                                          'variation'],
+                        choices=['all', 'item', 'variation'])
+    parser.add_argument('--engine', nargs='+', default=['sync'],
+                        choices=['sync', 'async'])
+    parser.add_argument('--size', type=int, default=50,
+                        help='Items/variations of the item/variation scope')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--items-per-page', type=int, default=100,
+                        dest='items_per_page')
+    parser.add_argument('--save', default=None,
+                        help='Save the results to a JSON file')
+    parser.add_argument('--baseline', default=None,
+                        help='Compare with the results of a previous run')
+    args = parser.parse_args()
+
+    server = start_server(**server_settings(args))
+    print(f"Mock server: {len(server.catalogue.variations)} variations, "
+          f"latency {args.latency * 1000:.0f} ms, error rate "
+          f"{args.error_rate:.1%}, call limit {args.call_limit or 'off'}")
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        config = write_config(directory=directory, url=server.url,
+                              attributes=args.attributes)
+        print(str(f"{'scenario':<20}{'wall':>9}{'requests':>10}{'rows':>8}"
+                  f"{'peak RSS':>11}"))
+        for name in args.scenario:
+            for engine in args.engine:
+                key = str(f'{name}/{engine}')
+                result = run_scenario(server=server, directory=directory,
+                                      config=config, name=name,
+                                      engine=engine, args=args)
+                results[key] = result
+                print(str(f"{key:<20}{result['wall']:>8.2f}s"
+                          f"{result['requests']:>10}{result['rows']:>8}"
+                          f"{result['peak'] / 2 ** 20:>8.1f} MiB"))
+    server.shutdown()
+
+    if args.save:
+        with open(args.save, mode='w') as result_file:
+            simplejson.dump(results, result_file, indent=2)
+    if args.baseline:
+        with open(args.baseline, mode='r') as baseline_file:
+            regressions = compare(results=results,
+                                  baseline=simplejson.load(baseline_file))
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""
+    Micro-benchmark of the variation row extraction on synthetic pages.
+
+    Compares the former per-entry implementation (re-split of the
+    configured attribute IDs and a linear attribute scan per entry and
+    attribute) with plentyapi.RowExtractor.
+
+    Usage:
+        python -m benchmarks.bench_row_extractor [--pages 200] [--size 250]
+"""
+import argparse
+import configparser
+import random
+import time
+
+import plenty_attribute_export.packages.plentyapi as pa
+
+ATTRIBUTE_COUNT = 12
+
+
+def build_config(selected):
+    config = configparser.ConfigParser()
+    config['PLENTY'] = {
+        'url': 'http://localhost',
+        'attribute_ids': ','.join(str(attribute) for attribute in selected),
+        'primary_market_id': '4',
+        'alternative_market_id': '5'
+    }
+    return config
+
+
+def build_pages(pages, size):
+    randomizer = random.Random(42)
+    variation_id = 1
+    result = []
+    for _ in range(pages):
+        entries = []
+        for _ in range(size):
+            attribute_ids = randomizer.sample(range(1, ATTRIBUTE_COUNT + 1), 8)
+            entries.append({
+                'id': variation_id, 'number': str(f'N{variation_id}'),
+                'itemId': variation_id // 5, 'isMain': variation_id % 5 == 0,
+                'variationSkus': [{'marketId': 4, 'parentSku': 'P1'}],
+                'variationAttributeValues': [
+                    {'attributeId': attribute_id,
+                     'attributeValue': {
+                         'id': attribute_id * 1000 + randomizer.randint(0, 300),
+                         'backendName': str(f'value{attribute_id}')}}
+                    for attribute_id in attribute_ids]
+            })
+            variation_id += 1
+        result.append(entries)
+    return result
+
+
+def legacy_get_attribute(data, dest, attribute_id):
+    if not 'variationAttributeValues' in data.keys():
+        dest += ['', '', '']
+        return
+    for attribute in data['variationAttributeValues']:
+        if attribute['attributeId'] == attribute_id:
+            dest += [attribute['attributeValue']['backendName'],
+                     attribute['attributeValue']['id'], '']
+            return
+    dest += ['', '', '']
+
+
+def legacy_extract(entries, dest, config):
+    for entry in entries:
+        if entry['isMain']:
+            continue
+        parent_sku = pa.get_market_parent_sku(
+            response=entry['variationSkus'], config=config)
+        variation = [entry['id'], entry['number'], parent_sku]
+        for attr_id in config['PLENTY']['attribute_ids'].split(','):
+            legacy_get_attribute(data=entry, dest=variation,
+                                 attribute_id=int(attr_id))
+        variation += [entry['itemId']]
+        dest.append(variation)
+
+
+def measure(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--pages', type=int, default=200)
+    parser.add_argument('--size', type=int, default=250)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    selected = [1, 4, 7]
+    config = build_config(selected=selected)
+    attributes = [{'name': str(f'attribute{index}'), 'id': index}
+                  for index in range(1, ATTRIBUTE_COUNT + 1)]
+    pages = build_pages(pages=args.pages, size=args.size)
+    # Silence the progress bar of the extractor
+    pa.get_progress().update = lambda done: None
+
+    def run_legacy():
+        rows = []
+        for entries in pages:
+            legacy_extract(entries=entries, dest=rows, config=config)
+        return rows
+
+    def run_extractor():
+        extractor = pa.RowExtractor(attributes=attributes, config=config)
+        buffers = extractor.new_buffers()
+        for entries in pages:
+            extractor.extract(entries=entries, buffers=buffers)
+        return buffers
+
+    legacy = measure(run_legacy, repeat=args.repeat)
+    compiled = measure(run_extractor, repeat=args.repeat)
+    rows = len(run_extractor()[0])
+    print(f"{rows} rows from {args.pages} pages of {args.size} entries")
+    print(f"legacy extraction : {legacy * 1000:8.1f} ms")
+    print(f"RowExtractor      : {compiled * 1000:8.1f} ms")
+    print(f"speedup           : {legacy / compiled:8.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+    Startup benchmark of the command line interface.
+
+    Imports the CLI module in a fresh interpreter with `python -X importtime`
+    and compares the median cumulative import time with BUDGET_MS. Heavy
+    dependencies (pandas, the GUI, ...) must only be loaded on the code
+    paths, which need them, importing one of them at startup fails the
+    benchmark as well.
+
+    Usage:
+        python -m benchmarks.bench_startup [--repeat 7] [--budget 250]
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+
+MODULE = 'plenty_attribute_export.cli'
+# Tracked budget for the import of the CLI, adjust it deliberately
+BUDGET_MS = 250
+HEAVY_MODULES = ('pandas', 'numpy', 'tabulate', 'easygui', 'tkinter',
+                 'aiohttp', 'pyarrow')
+
+
+def import_times():
+    """
+        Import the CLI in a new interpreter.
+
+        Return:
+            [Dict] : Mapping of module name to cumulative import time in ms
+    """
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', str(f'import {MODULE}')],
+        capture_output=True, text=True, check=True)
+    times = {}
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(cumulative) / 1000
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--repeat', type=int, default=7)
+    parser.add_argument('--budget', type=float, default=BUDGET_MS)
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args()
+
+    # The first run compiles the bytecode of changed modules
+    import_times()
+    runs = [import_times() for _ in range(args.repeat)]
+    total = statistics.median(run[MODULE] for run in runs)
+    heavy = sorted({module.split('.')[0] for module in runs[-1]
+                    if module.split('.')[0] in HEAVY_MODULES})
+
+    print(f"Slowest imports of {MODULE} (cumulative):")
+    for name, duration in sorted(runs[-1].items(), key=lambda item: item[1],
+                                 reverse=True)[:args.top]:
+        print(f"  {duration:8.1f} ms  {name}")
+    print(f"import {MODULE}: {total:.1f} ms (median of {args.repeat}, "
+          f"budget {args.budget:.0f} ms)")
+
+    failed = False
+    if heavy:
+        print(f"FAIL: heavy modules imported at startup: {', '.join(heavy)}")
+        failed = True
+    if total > args.budget:
+        print("FAIL: startup budget exceeded")
+        failed = True
+    if not failed:
+        print("OK")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
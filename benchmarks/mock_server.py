@@ -0,0 +1,395 @@
+"""
+    Local stand-in for the PlentyMarkets REST API, serving a synthetic
+    catalogue for benchmarks and offline experiments.
+
+    Imitated endpoints:
+        POST /rest/login, POST /rest/login/refresh
+        GET  /rest/items/attributes                              (paginated)
+        GET  /rest/items/variations                              (paginated,
+             filters: id, itemId, isMain, updatedBetween;
+             with=variationSkus)
+        GET  /rest/items/{item}/variations                       (paginated)
+        GET  /rest/items/{item}/variations/{variation}
+        GET  /rest/items/{item}/variations/{variation}/variation_skus
+        GET  /rest/items/attributes/{attribute}/values           (paginated,
+             with=names)
+        GET  /rest/items/attribute_values/{value}/names/{lang}
+
+    The response latency, a share of failing requests (503) and the call
+    limit of the short period (X-Plenty-Global-Short-Period-* headers,
+    429 when exceeded) can be configured.
+
+    Usage:
+        python -m benchmarks.mock_server [--port 8080] [--items 1000]
+"""
+import argparse
+import http.server
+import random
+import re
+import threading
+import time
+import urllib.parse
+import simplejson
+
+PRIMARY_MARKET = 4
+ALTERNATIVE_MARKET = 5
+LANGUAGES = ('de', 'en', 'fr', 'it', 'es')
+
+
+class Catalogue():
+    """
+        Deterministic set of items, variations and attributes.
+
+        Parameter:
+            items [Int]         : Amount of items
+            variations [Int]    : Variations per item (plus a main variation)
+            attributes [Int]    : Amount of attributes, every variation has
+                                  a value for each of them
+            values [Int]        : Values per attribute
+    """
+    def __init__(self, items=100, variations=4, attributes=3, values=20):
+        self.attributes = [{'id': attribute, 'backendName': str(
+            f'attribute{attribute}')} for attribute in
+                           range(1, attributes + 1)]
+        self.values = {}
+        for attribute in self.attributes:
+            for index in range(values):
+                value_id = attribute['id'] * 1000 + index
+                self.values[value_id] = {
+                    'id': value_id, 'attributeId': attribute['id'],
+                    'backendName': str(f"{attribute['backendName']}-{index}")}
+        self.variations = []
+        self.by_id = {}
+        # UNIX timestamp of the last change of each variation
+        self.updated = {}
+        variation_id = 1000
+        for item in range(1, items + 1):
+            for index in range(variations + 1):
+                variation = {
+                    'id': variation_id, 'itemId': item,
+                    'number': str(f'V{variation_id}'), 'isMain': index == 0,
+                    'variationAttributeValues': [{
+                        'attributeId': attribute['id'],
+                        'valueId': attribute['id'] * 1000 +
+                                   (variation_id + attribute['id']) % values,
+                        'attributeValue': self.values[
+                            attribute['id'] * 1000 +
+                            (variation_id + attribute['id']) % values]}
+                        for attribute in self.attributes]}
+                self.variations.append(variation)
+                self.by_id[variation_id] = variation
+                self.updated[variation_id] = 0
+                variation_id += 1
+
+    def touch(self, item):
+        """ Mark the variations of the item as changed right now. """
+        for variation in self.variations:
+            if variation['itemId'] == item:
+                self.updated[variation['id']] = time.time()
+
+    def skus(self, variation):
+        return [{'variationId': variation['id'], 'marketId': market,
+                 'parentSku': str(f"P{variation['itemId']}-{market}")}
+                for market in (PRIMARY_MARKET, ALTERNATIVE_MARKET)]
+
+
+class MockServer(http.server.ThreadingHTTPServer):
+    """
+        Threaded HTTP server with the state shared by the handlers.
+
+        Parameter:
+            catalogue [Catalogue]
+            latency [Float]     : Seconds added to every response
+            jitter [Float]      : Maximum random seconds on top of the latency
+            error_rate [Float]  : Share of GET requests answered with 503
+            call_limit [Int]    : Calls per period, 0 disables the limit
+            decay [Int]         : Length of a call limit period in seconds
+            seed [Int]          : Seed of the random errors and jitter
+    """
+    daemon_threads = True
+    # the default backlog of 5 drops the connections of a concurrent burst,
+    # which are then only retried after a second by the client
+    request_queue_size = 128
+
+    def __init__(self, address, catalogue, latency=0.0, jitter=0.0,
+                 error_rate=0.0, call_limit=0, decay=5, seed=42):
+        super().__init__(address, MockHandler)
+        self.catalogue = catalogue
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.call_limit = call_limit
+        self.decay = decay
+        self.lock = threading.Lock()
+        self.random = random.Random(seed)
+        self.tokens = set()
+        self.refresh_tokens = set()
+        self.period_start = time.monotonic()
+        self.period_calls = 0
+        # requests answered with 429, because the call limit was exceeded
+        self.rejected = 0
+        self.counts = {}
+
+    @property
+    def url(self):
+        return str(f'http://127.0.0.1:{self.server_port}')
+
+    def reset_counts(self):
+        with self.lock:
+            self.counts = {}
+
+    def count(self, key):
+        with self.lock:
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    def next_call(self):
+        """
+            Account a call within the current period.
+
+            Return:
+                [Tuple] : (allowed, calls left, seconds until reset)
+        """
+        with self.lock:
+            now = time.monotonic()
+            if now - self.period_start >= self.decay:
+                self.period_start = now
+                self.period_calls = 0
+            self.period_calls += 1
+            left = self.call_limit - self.period_calls
+            reset = max(int(self.decay - (now - self.period_start)), 1)
+            if left < 0:
+                self.rejected += 1
+            return (left >= 0, max(left, 0), reset)
+
+    def delay(self):
+        with self.lock:
+            extra = self.random.uniform(0, self.jitter) if self.jitter else 0
+            failed = self.random.random() < self.error_rate
+        return (self.latency + extra, failed)
+
+    def issue_token(self):
+        with self.lock:
+            token = str(f'mock-{len(self.tokens)}-{time.monotonic_ns()}')
+            refresh = str(f'refresh-{token}')
+            self.tokens.add(token)
+            self.refresh_tokens.add(refresh)
+        return {'token_type': 'Bearer', 'access_token': token,
+                'refresh_token': refresh, 'expires_in': 86400}
+
+
+class MockHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def send_json(self, data, status=200, headers=None):
+        body = simplejson.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+        path = urllib.parse.urlsplit(self.path)
+        query = urllib.parse.parse_qs(path.query)
+        if path.path == '/rest/login':
+            self.server.count('POST /rest/login')
+            if not query.get('username') or not query.get('password'):
+                return self.send_json({'error': 'invalid_credentials'}, 401)
+            return self.send_json(self.server.issue_token())
+        if path.path == '/rest/login/refresh':
+            self.server.count('POST /rest/login/refresh')
+            if query.get('refresh_token', [''])[0] not in\
+                    self.server.refresh_tokens:
+                return self.send_json({'error': 'invalid_token'}, 401)
+            return self.send_json(self.server.issue_token())
+        return self.send_json({'error': 'not found'}, 404)
+
+    def do_GET(self):
+        path = urllib.parse.urlsplit(self.path)
+        query = {key: values[0] for key, values in
+                 urllib.parse.parse_qs(path.query).items()}
+        self.server.count('GET ' + re.sub(r'/\d+', '/{id}', path.path))
+        token = self.headers.get('Authorization', '').split(' ')[-1]
+        if token not in self.server.tokens:
+            return self.send_json({'error': 'unauthenticated'}, 401)
+
+        headers = {}
+        if self.server.call_limit:
+            allowed, left, reset = self.server.next_call()
+            headers = {
+                'X-Plenty-Global-Short-Period-Limit':
+                    str(self.server.call_limit),
+                'X-Plenty-Global-Short-Period-Calls-Left': str(left),
+                'X-Plenty-Global-Short-Period-Decay': str(reset)}
+            if not allowed:
+                headers['Retry-After'] = str(reset)
+                return self.send_json({'error': 'too many requests'}, 429,
+                                      headers=headers)
+        latency, failed = self.server.delay()
+        if latency:
+            time.sleep(latency)
+        if failed:
+            return self.send_json({'error': 'unavailable'}, 503,
+                                  headers=headers)
+        response = self.route(path=path.path, query=query)
+        if response is None:
+            return self.send_json({'error': 'not found'}, 404,
+                                  headers=headers)
+        return self.send_json(response, headers=headers)
+
+    def route(self, path, query):
+        catalogue = self.server.catalogue
+        relations = query.get('with', '')
+        if path == '/rest/items/attributes':
+            return paginate(catalogue.attributes, query)
+        if path == '/rest/items/variations':
+            entries = catalogue.variations
+            if 'id' in query:
+                entries = [catalogue.by_id[int(variation)] for variation in
+                           query['id'].split(',')
+                           if int(variation) in catalogue.by_id]
+            if 'itemId' in query:
+                items = {int(item) for item in query['itemId'].split(',')}
+                entries = [entry for entry in entries
+                           if entry['itemId'] in items]
+            if query.get('isMain') == 'false':
+                entries = [entry for entry in entries if not entry['isMain']]
+            if 'updatedBetween' in query:
+                bounds = [float(bound) for bound in
+                          query['updatedBetween'].split(',')]
+                end = bounds[1] if len(bounds) > 1 else float('inf')
+                entries = [entry for entry in entries if bounds[0] <=
+                           catalogue.updated.get(entry['id'], 0) <= end]
+            return paginate(entries, query, relations=relations,
+                            catalogue=catalogue)
+        match = re.fullmatch(r'/rest/items/(\d+)/variations', path)
+        if match:
+            entries = [entry for entry in catalogue.variations
+                       if entry['itemId'] == int(match[1])]
+            return paginate(entries, query, relations=relations,
+                            catalogue=catalogue)
+        match = re.fullmatch(r'/rest/items/(\d+)/variations/(\d+)', path)
+        if match:
+            variation = catalogue.by_id.get(int(match[2]))
+            if not variation:
+                return None
+            return with_relations(variation, relations, catalogue)
+        match = re.fullmatch(
+            r'/rest/items/(\d+)/variations/(\d+)/variation_skus', path)
+        if match:
+            variation = catalogue.by_id.get(int(match[2]))
+            return catalogue.skus(variation) if variation else []
+        match = re.fullmatch(r'/rest/items/attributes/(\d+)/values', path)
+        if match:
+            entries = [value for value in catalogue.values.values()
+                       if value['attributeId'] == int(match[1])]
+            if 'names' in relations:
+                entries = [dict(value, valueNames=[
+                    {'valueId': value['id'], 'lang': lang,
+                     'name': str(f"{value['backendName']} ({lang})")}
+                    for lang in LANGUAGES]) for value in entries]
+            return paginate(entries, query)
+        match = re.fullmatch(
+            r'/rest/items/attribute_values/(\d+)/names/(\w+)', path)
+        if match:
+            value = catalogue.values.get(int(match[1]))
+            if not value or match[2] not in LANGUAGES:
+                return {}
+            return {'valueId': value['id'], 'lang': match[2],
+                    'name': str(f"{value['backendName']} ({match[2]})")}
+        return None
+
+
+def with_relations(variation, relations, catalogue):
+    if 'variationSkus' not in relations:
+        return variation
+    return dict(variation, variationSkus=catalogue.skus(variation))
+
+
+def paginate(entries, query, relations='', catalogue=None):
+    items_per_page = int(query.get('itemsPerPage', 50))
+    page = int(query.get('page', 1))
+    last_page = max((len(entries) + items_per_page - 1) // items_per_page, 1)
+    selection = entries[(page - 1) * items_per_page:page * items_per_page]
+    if catalogue is not None:
+        selection = [with_relations(entry, relations, catalogue)
+                     for entry in selection]
+    return {'page': page, 'totalsCount': len(entries),
+            'isLastPage': page >= last_page, 'lastPageNumber': last_page,
+            'firstOnPage': (page - 1) * items_per_page + 1,
+            'lastOnPage': (page - 1) * items_per_page + len(selection),
+            'itemsPerPage': items_per_page, 'entries': selection}
+
+
+def start_server(port=0, **settings):
+    """
+        Run the mock server within a background thread.
+
+        Parameter:
+            port [Int] : Port of the server, 0 picks a free port
+            settings   : Catalogue (items, variations, attributes, values)
+                         and server options (see MockServer)
+
+        Return:
+            [MockServer]
+    """
+    catalogue_options = ('items', 'variations', 'attributes', 'values')
+    catalogue = Catalogue(**{key: value for key, value in settings.items()
+                             if key in catalogue_options})
+    server = MockServer(('127.0.0.1', port), catalogue=catalogue,
+                        **{key: value for key, value in settings.items()
+                           if key not in catalogue_options})
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def add_server_arguments(parser):
+    parser.add_argument('--items', type=int, default=100)
+    parser.add_argument('--variations', type=int, default=4,
+                        help='Variations per item')
+    parser.add_argument('--attributes', type=int, default=3)
+    parser.add_argument('--values', type=int, default=20,
+                        help='Values per attribute')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='Seconds added to every response')
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        dest='error_rate')
+    parser.add_argument('--call-limit', type=int, default=0,
+                        dest='call_limit', help='Calls per period, 0 = off')
+    parser.add_argument('--decay', type=int, default=5,
+                        help='Seconds of a call limit period')
+
+
+def server_settings(args):
+    return {key: getattr(args, key) for key in
+            ('items', 'variations', 'attributes', 'values', 'latency',
+             'jitter', 'error_rate', 'call_limit', 'decay')}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--port', type=int, default=8080)
+    add_server_arguments(parser)
+    args = parser.parse_args()
+    server = start_server(port=args.port, **server_settings(args))
+    print(f"Serving {len(server.catalogue.variations)} variations at "
+          f"{server.url} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
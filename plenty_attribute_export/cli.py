@@ -20,20 +20,125 @@ import os
 import configparser
 import argparse
 import datetime
-import tabulate
-import easygui
+import time
 
 import plenty_attribute_export.packages.plentyapi as pa
-import plenty_attribute_export.packages.progress as pro
+import plenty_attribute_export.packages.client as cl
+import plenty_attribute_export.packages.translation as tr
+import plenty_attribute_export.packages.cache as ca
+import plenty_attribute_export.packages.incremental as inc
+import plenty_attribute_export.packages.checkpoint as cp
+import plenty_attribute_export.packages.output as out
+import plenty_attribute_export.packages.keyring as kr
+import plenty_attribute_export.packages.metrics as mt
+import plenty_attribute_export.packages.scheduler as sc
+import plenty_attribute_export.packages.store as st
+
+# os.getlogin requires a controlling terminal (not available for cron jobs)
+CONFIG_FILE = os.path.join(os.path.expanduser('~'),
+                           '.plenty_export_config.ini')
+CACHE_FILE = os.path.join(os.path.dirname(CONFIG_FILE),
+                          '.plenty_export_cache.sqlite')
+STATE_FILE = os.path.join(os.path.dirname(CONFIG_FILE),
+                          '.plenty_export_state.json')
+STORE_FILE = os.path.join(os.path.dirname(CONFIG_FILE),
+                          '.plenty_export_store.sqlite')
+LANGUAGES = ['en', 'fr', 'it', 'es']
+# Options of a multi-profile export, that are replaced for each profile
+PROFILE_OPTIONS = ('--profiles', '--output', '--max-requests',
+                   '--profile-output', '--config-file')
+# Attribute values are renamed very rarely, a week is a safe default
+DEFAULT_CACHE_TTL_HOURS = 168
+
+
+def parse_languages(value):
+    """
+        Parse the language option, either a comma separated list of
+        languages or 'all' for every supported language.
+
+        Return:
+            [List] : Unique languages in the order of the option
+    """
+    if value == 'all':
+        return list(LANGUAGES)
+    langs = [lang.strip() for lang in value.split(',') if lang.strip()]
+    invalid = [lang for lang in langs if lang not in LANGUAGES]
+    if not langs or invalid:
+        raise argparse.ArgumentTypeError(
+            "invalid language(s): {0} (choose from {1} or all)"
+            .format(','.join(invalid), ','.join(LANGUAGES)))
+    return list(dict.fromkeys(langs))
+
+
+def parse_id_list(value):
+    """
+        Parse the item/variation option, either a comma separated list of
+        IDs or the path of a file with the IDs (separated by commas,
+        spaces or line breaks).
+
+        Return:
+            [List] : Unique IDs in the order of the option
+    """
+    if os.path.isfile(value):
+        with open(value, mode='r') as id_file:
+            value = id_file.read()
+    ids = value.replace(',', ' ').split()
+    invalid = [entry for entry in ids if not entry.isdigit()]
+    if not ids or invalid:
+        raise argparse.ArgumentTypeError(
+            "invalid ID(s): {0} (expected a comma separated list or a file "
+            "of IDs)".format(','.join(invalid)))
+    return list(dict.fromkeys(ids))
+
+
+def parse_attribute_ids(value):
+    """
+        Parse the attributes option, a comma separated list of attribute IDs.
+
+        Return:
+            [String] : Attribute IDs in the format of the configuration
+    """
+    ids = [attribute_id.strip() for attribute_id in value.split(',')
+           if attribute_id.strip()]
+    if not ids or not all(attribute_id.isdigit() for attribute_id in ids):
+        raise argparse.ArgumentTypeError(
+            str(f"invalid attribute IDs: {value} (e.g. 1,2,3)"))
+    return ','.join(ids)
+
+
+def parse_positive_int(value):
+    """
+        Parse an option, that requires at least one unit (e.g. workers).
+
+        Return:
+            [Int]
+    """
+    if not value.strip().isdigit() or int(value) < 1:
+        raise argparse.ArgumentTypeError(
+            str(f"invalid value: {value} (expected a positive integer)"))
+    return int(value)
+
+
+def parse_profiles(value):
+    """
+        Parse the profiles option, a comma separated list of configuration
+        files.
+
+        Return:
+            [List] : Absolute paths of the configuration files
+    """
+    paths = [os.path.abspath(path.strip()) for path in value.split(',')
+             if path.strip()]
+    missing = [path for path in paths if not os.path.isfile(path)]
+    if not paths or missing:
+        raise argparse.ArgumentTypeError(
+            "missing configuration file(s): {0}".format(','.join(missing)))
+    names = [sc.profile_name(path) for path in paths]
+    if len(set(names)) != len(names):
+        raise argparse.ArgumentTypeError(
+            "the configuration files require unique file names")
+    return list(dict.fromkeys(paths))
 
-if sys.platform == 'linux':
-    linux_user = os.getlogin()
-    CONFIG_FILE = os.path.join('/', 'home', str(f'{linux_user}'),
-                               '.plenty_export_config.ini')
-elif sys.platform == 'win32':
-    win_user = os.getlogin()
-    CONFIG_FILE = os.path.join('C:', 'Users', str(f'{win_user}'),
-                               '.plenty_export_config.ini')
 
 def create_argparser():
     """ Set up the argument parser, with the different arguments
@@ -43,69 +148,237 @@ def create_argparser():
     argparser.add_argument(
         '-s', '--scope', default='all',
         choices=['all', 'item', 'variation'],
-        help='Pull all variations/A whole item/single variation',
+        help='Pull all variations/whole items/single variations',
         dest='scope_name')
     argparser.add_argument(
-        '-i', '--item', default=0,
-        help='Item ID for the scope = item option',
+        '-i', '--item', default=[], type=parse_id_list,
+        help='Item IDs for the scope = item option, comma separated or '
+             'the path of a file with IDs',
         dest='scope_item')
     argparser.add_argument(
-        '-v', '--var', default=0,
-        help='Variation ID for the scope = variaion option',
+        '-v', '--var', default=[], type=parse_id_list,
+        help='Variation IDs for the scope = variation option, comma '
+             'separated or the path of a file with IDs',
         dest='scope_variation')
     argparser.add_argument(
-        '-l', '--lang', default='en',
-        choices=['en', 'fr', 'it', 'es'],
-        help='Language to be exported from PlentyMarkets',
-        dest='lang')
+        '-l', '--lang', default=['en'], type=parse_languages,
+        help='Languages to be exported from PlentyMarkets, comma separated '
+             '({0}) or all'.format(','.join(LANGUAGES)),
+        dest='langs')
     argparser.add_argument(
         '-o', '--stdout', action='store_true',
         help='Do not print to a file but to the console instead',
         dest='stdout')
+    argparser.add_argument(
+        '--stdout-format', default='auto', choices=list(out.STDOUT_FORMATS),
+        help='Console output: table, tab separated values, JSON lines or '
+             'fixed-width columns (auto: table up to {0} rows)'
+             .format(out.TABLE_MAX_ROWS),
+        dest='stdout_format')
+    argparser.add_argument(
+        '-f', '--format', default='csv', choices=list(out.FORMATS.keys()),
+        help='File format of the export (parquet/feather require pyarrow)',
+        dest='output_format')
+    argparser.add_argument(
+        '--compression', default=None,
+        help='Compression of the export file, csv/jsonl: {0}, parquet: {1}, '
+             'feather: {2}'.format(*[','.join(out.COMPRESSIONS[fmt]) for fmt
+                                     in ('csv', 'parquet', 'feather')]),
+        dest='compression')
     argparser.add_argument(
         '-c', '--config', action='store_true',
         help='Change elements of the configuration',
         dest='configuration')
+    argparser.add_argument(
+        '--headless', action='store_true',
+        help='Never prompt or open a dialog (for cron jobs and containers), '
+             'requires an existing configuration',
+        dest='headless')
+    argparser.add_argument(
+        '--output', default=None,
+        help='Location of the export file, instead of choosing it in a dialog',
+        dest='output')
+    argparser.add_argument(
+        '--config-file', default=None,
+        help='Location of the configuration file (default: {0})'
+             .format(CONFIG_FILE),
+        dest='config_file')
+    argparser.add_argument(
+        '--profiles', default=None, type=parse_profiles,
+        help='Comma separated configuration files, which are exported at '
+             'the same time into the --output folder (headless)',
+        dest='profiles')
+    argparser.add_argument(
+        '--max-requests', type=parse_positive_int, default=20,
+        help='Maximum amount of concurrent requests of all profiles',
+        dest='max_requests')
+    argparser.add_argument(
+        '--attributes', default=None, type=parse_attribute_ids,
+        help='Comma separated attribute IDs, overrides the configuration',
+        dest='attribute_ids')
+    argparser.add_argument(
+        '--credentials', default=None,
+        help='JSON file with the username and password of the API user, '
+             'alternatively set {0}/{1}'.format(kr.USERNAME_VARIABLE,
+                                               kr.PASSWORD_VARIABLE),
+        dest='credentials')
+    argparser.add_argument(
+        '--refresh-cache', action='store_true',
+        help='Ignore the cached attribute data and fetch it again',
+        dest='refresh_cache')
+    argparser.add_argument(
+        '--no-cache', action='store_true',
+        help='Neither read nor write the local attribute cache',
+        dest='no_cache')
+    argparser.add_argument(
+        '--pool-size', type=parse_positive_int, default=None,
+        help='Amount of kept-alive connections to the PlentyMarkets API',
+        dest='pool_size')
+    argparser.add_argument(
+        '--timeout', type=float, default=None,
+        help='Seconds to wait for a response of the API',
+        dest='timeout')
+    argparser.add_argument(
+        '--retries', type=int, default=None,
+        help='Retries for failed requests (connection errors, 429, 5xx)',
+        dest='retries')
+    argparser.add_argument(
+        '--items-per-page', type=parse_positive_int,
+        default=pa.DEFAULT_ITEMS_PER_PAGE,
+        help='Amount of variations requested per page',
+        dest='items_per_page')
+    argparser.add_argument(
+        '-w', '--workers', type=parse_positive_int,
+        default=pa.DEFAULT_WORKERS,
+        help='Amount of pages/lookups requested concurrently',
+        dest='workers')
+    argparser.add_argument(
+        '--prefetch', default='auto', choices=['auto', 'on', 'off'],
+        help='Download the complete value lists of the selected attributes '
+             'before the translation (auto: only for the scope all)',
+        dest='prefetch')
+    argparser.add_argument(
+        '--engine', default='sync', choices=['sync', 'async'],
+        help='Threaded (sync) or asyncio (async, requires aiohttp) requests',
+        dest='engine')
+    argparser.add_argument(
+        '--max-inflight', type=parse_positive_int, default=100,
+        help='Amount of concurrent requests of the async engine',
+        dest='max_inflight')
+    argparser.add_argument(
+        '--incremental', action='store_true',
+        help='Only fetch variations changed since the last export',
+        dest='incremental')
+    argparser.add_argument(
+        '--detect-deletions', action='store_true',
+        help='With --incremental, list the IDs of every variation to remove '
+             'deleted variations from the export (requests every page of the '
+             'catalogue, e.g. only for a weekly run)',
+        dest='detect_deletions')
+    argparser.add_argument(
+        '--stream', action='store_true',
+        help='Write the variations page by page to the output file',
+        dest='stream')
+    argparser.add_argument(
+        '--resume', action='store_true',
+        help='Continue an interrupted export from its last checkpoint',
+        dest='resume')
+    argparser.add_argument(
+        '--store', action='store_true',
+        help='Save the export into the local store, which answers lookups '
+             'with the query command',
+        dest='store')
+    argparser.add_argument(
+        '--profile', action='store_true',
+        help='Print the time spent per phase and per API endpoint',
+        dest='profile')
+    argparser.add_argument(
+        '--profile-output', default=None,
+        help='Save the timings of every API request to this JSON file',
+        dest='profile_output')
     namespace = argparser.parse_args()
     if namespace.scope_name == 'item' and not namespace.scope_item:
         print("ERROR: The scope=item option requires: [-i/--item].")
+        sys.exit(1)
     elif namespace.scope_name == 'variation' and not namespace.scope_variation:
         print("ERROR: The scope=variation option requires: [-v/--var].")
+        sys.exit(1)
+    if namespace.incremental and namespace.scope_name != 'all':
+        print("ERROR: The incremental option requires: [-s/--scope all].")
+        sys.exit(1)
+    if namespace.detect_deletions and not namespace.incremental:
+        print("ERROR: The detect-deletions option requires: [--incremental].")
+        sys.exit(1)
+    if namespace.stream and (namespace.incremental or namespace.resume):
+        print("ERROR: The stream option cannot be combined with: "
+              "[--incremental, --resume].")
+        sys.exit(1)
+    if namespace.stream and writes_stdout(namespace=namespace) and\
+            namespace.stdout_format == 'table':
+        print("ERROR: The table cannot be streamed, use: "
+              "[--stdout-format tsv/ndjson/fixed].")
+        sys.exit(1)
+    if namespace.headless and not namespace.output and\
+            not (namespace.stdout and namespace.scope_name != 'all'):
+        print("ERROR: The headless option requires: [--output] (or "
+              "[-o/--stdout] for the item/variation scope).")
+        sys.exit(1)
+    if namespace.profiles and (namespace.config_file or
+                               namespace.configuration or namespace.stdout):
+        print("ERROR: The profiles option cannot be combined with: "
+              "[--config-file, -c/--config, -o/--stdout].")
+        sys.exit(1)
+    if namespace.profiles and (not namespace.output or
+                               not os.path.isdir(namespace.output)):
+        print("ERROR: The profiles option requires an existing folder "
+              "for: [--output].")
+        sys.exit(1)
+    if namespace.headless and namespace.configuration:
+        print("ERROR: The configuration cannot be edited in headless mode.")
+        sys.exit(1)
+    if namespace.stream and namespace.output_format not in out.STREAM_FORMATS:
+        print("ERROR: The stream option requires: [-f/--format {0}]."
+              .format('/'.join(out.STREAM_FORMATS)))
+        sys.exit(1)
+    if namespace.compression and namespace.compression not in\
+            out.COMPRESSIONS[namespace.output_format]:
+        print("ERROR: Invalid compression {0} for the {1} format, choose "
+              "from: {2}.".format(namespace.compression,
+                                  namespace.output_format,
+                                  ','.join(out.COMPRESSIONS[
+                                      namespace.output_format])))
+        sys.exit(1)
 
     if namespace.scope_name == 'all':
         scope = {'name':'all',
-                 'args':{'item':'', 'variation': ''}}
+                 'args':{'item':[], 'variation': []}}
     elif namespace.scope_name == 'item':
         scope = {'name':'item',
-                 'args':{'item':namespace.scope_item, 'variation': ''}}
+                 'args':{'item':namespace.scope_item, 'variation': []}}
     elif namespace.scope_name == 'variation':
         scope = {'name':'variation',
-                 'args':{'item':'', 'variation': namespace.scope_variation}}
+                 'args':{'item':[], 'variation': namespace.scope_variation}}
 
     return {'scope':scope, 'namespace':namespace}
 
+
 def get_item_set(data):
     """ Get a dictionary of every unique item id within the variation frame """
     unique_item_ids = data['item-id'].unique()
     return {str(key):None for key in unique_item_ids}
 
-def get_parent_sku_for_item(url, headers, item, config):
-    """ Get a random variation ID, which is present in the specified item.
-        Then go on to get the parent SKU value, within primary/alternative
-        market for that item. (The IDs for those markets are set in the config)
-    """
-    childs = pa.plenty_api_get_childs_for_item(
-        url=url, headers=headers, item=item)
-    parent_sku = pa.plenty_api_get_market_sku(
-        url=url, headers=headers, item=item, variation_id=childs[0],
-        config=config)
-    return parent_sku
 
-def get_parent_sku(url, headers, config, data):
+def get_parent_sku(url, headers, config, data, workers=pa.DEFAULT_WORKERS,
+                   api=pa, known=None, checkpoint=None):
     """
         Reduce the total amount of API GET requests by acquiring a
         set of unique item IDs and map parent SKUs to each.
 
+        The parent SKUs are usually part of the variation data already
+        (variationSkus relation), only items without that data are looked
+        up with a concurrent request for one of their variations from the
+        frame.
+
         Parameter:
             url [String]    : Base URL of the shop provided by the config
             headers [Dict]  : HTTP header for the GET request
@@ -113,14 +386,221 @@ def get_parent_sku(url, headers, config, data):
             config [Dict]   : Config mapping of values used in
                               the plentymarkets client
             data [DataFrame]: pandas DataFrame of the variations.
+            workers [Int]   : Maximum amount of concurrent requests
+            api [Module]    : Engine used for the requests
+            known [Dict]    : Parent SKUs resolved earlier within the run
+                              (item ID -> SKU), updated with the results
+            checkpoint [Checkpoint]: Optional record of the resolved SKUs
     """
     item_ids = get_item_set(data=data)
-    for key in item_ids.keys():
-        parent_sku = get_parent_sku_for_item(url=url, headers=headers,
-                                             item=int(key), config=config)
-        item_ids[str(key)] = parent_sku
-    data['parent-variation'] = data['item-id'].apply(
-        lambda x: item_ids[str(x)])
+    restored = dict(checkpoint.skus) if checkpoint else {}
+    if known:
+        restored.update(known)
+    if restored:
+        for key in item_ids.keys():
+            item_ids[key] = restored.get(key)
+    for item, sku in zip(data['item-id'], data['parent-variation']):
+        if sku and item_ids[str(item)] in (None, 'Not found'):
+            item_ids[str(item)] = sku
+
+    missing = [key for key, value in item_ids.items() if value is None]
+    if missing:
+        children = data[data['item-id'].astype(str).isin(missing)]\
+            .drop_duplicates(subset='item-id')
+        variations = {int(item): int(variation) for item, variation in
+                      zip(children['item-id'], children['variation-id'])}
+        items = list(variations.keys())
+        for start in range(0, len(items), cp.BATCH_SIZE):
+            parent_skus = api.plenty_api_get_market_skus(
+                url=url, headers=headers, config=config,
+                variations={item: variations[item] for item in
+                            items[start:start + cp.BATCH_SIZE]},
+                workers=workers)
+            parent_skus = {str(item): parent_sku
+                           for item, parent_sku in parent_skus.items()}
+            item_ids.update(parent_skus)
+            if checkpoint:
+                checkpoint.add_skus(skus=parent_skus)
+    data['parent-variation'] = data['item-id'].map(
+        lambda x: item_ids[str(x)]).astype('category')
+    if known is not None:
+        known.update(item_ids)
+
+
+def check_variations(variations, frame):
+    """
+        Report the requested variations, which are missing in the export,
+        exit if none of them was found.
+
+        Parameter:
+            variations [List]   : Requested variation IDs
+            frame [DataFrame]   : pandas DataFrame of the variations
+    """
+    found = {str(variation) for variation in frame['variation-id']}
+    missing = [variation for variation in variations
+               if variation not in found]
+    if len(missing) == len(variations):
+        print("ERROR: No variation found for: {0}".format(','.join(missing)))
+        sys.exit(1)
+    if missing:
+        print("WARNING: No variation found for: {0}"
+              .format(','.join(missing)))
+
+
+def writes_stdout(namespace):
+    """ The item/variation scope can be printed instead of saved. """
+    return namespace.stdout and namespace.scope_name != 'all'
+
+
+def stream_export(url, headers, config, scope, namespace, attributes,
+                  resolver, output_path, api=pa, workers=pa.DEFAULT_WORKERS,
+                  console=None, store=None, exported_at=None,
+                  failed_pages=None):
+    """
+        Write the export page by page, instead of collecting every
+        variation before writing the file. Each page is enriched with the
+        parent SKUs and translations and appended to the output file, the
+        resolved SKUs and translations are kept for the following pages.
+
+        Parameter:
+            url [String]        : Base URL of the shop provided by the config
+            headers [Dict]      : HTTP header for the GET request
+            config [Dict]       : Config mapping of values used in
+                                  the plentymarkets client
+            scope [Dict]        : User defined options about the breadth of
+                                  the data pull
+            namespace [Namespace]: Parsed command line arguments
+            attributes [List]   : Selected attributes ({name, id})
+            resolver [TranslationResolver]
+            output_path [String]: Location of the CSV/JSON lines file
+            api [Module]        : Engine used for the SKU/translation requests
+            workers [Int]       : Maximum amount of concurrent requests
+            console [File]      : Write to this stream instead of the file
+            store [ExportStore] : Optional local store, updated per page
+            exported_at [Float] : UNIX timestamp of the export for the store
+            failed_pages [List] : Collects the pages, that failed to download
+
+        Return:
+            [Int] : Amount of written rows
+    """
+    extractor = pa.RowExtractor(attributes=attributes, config=config)
+    parent_skus = {}
+    if console:
+        writer = out.StdoutWriter(file=console, fmt=out.stdout_format(
+            fmt=namespace.stdout_format, tty=console.isatty()))
+    else:
+        writer = out.StreamWriter(path=output_path,
+                                  fmt=namespace.output_format,
+                                  compression=namespace.compression)
+    offset = 0
+    for _, _, entries in pa.iterate_variation_pages(
+            url=url, headers=headers, scope=scope,
+            items_per_page=namespace.items_per_page,
+            workers=namespace.workers, failed_pages=failed_pages,
+            progress=pa.get_progress()):
+        buffers = extractor.new_buffers()
+        extractor.extract(entries=entries, buffers=buffers, offset=offset)
+        offset += len(entries)
+        if not buffers[0]:
+            continue
+        chunk = extractor.build_frame(buffers=buffers)
+        get_parent_sku(url=url, headers=headers, config=config, data=chunk,
+                       workers=workers, api=api, known=parent_skus)
+        resolver.apply(frame=chunk, attributes=attributes,
+                       langs=namespace.langs)
+        writer.write(chunk=chunk)
+        if store:
+            store.update(frame=chunk, langs=namespace.langs,
+                         exported_at=exported_at)
+    writer.close()
+    pa.get_progress().finish()
+    return writer.written
+
+
+def load_previous_export(config, attributes, langs):
+    """
+        Get the snapshot of the last export for an incremental export.
+        A changed selection of attributes requires a complete export.
+
+        Parameter:
+            config [Config object]
+            attributes [List] : Attributes of the shop ({name, id})
+            langs [List]      : Exported languages
+
+        Return:
+            [Tuple] : (state of the last export, snapshot DataFrame) or
+                      (None, None) when a complete export is required
+    """
+    state = inc.load_state(path=STATE_FILE, url=config['PLENTY']['url'])
+    if not state:
+        return (None, None)
+    previous = inc.read_snapshot(path=state['snapshot'])
+    if previous is None:
+        return (None, None)
+    columns = tr.expand_columns(
+        columns=pa.build_columns(attr=attributes, config=config), langs=langs)
+    if list(previous.columns) != columns:
+        print("Attribute/language selection changed, "
+              "running a complete export.")
+        return (None, None)
+    return (state, previous)
+
+
+def use_prefetch(namespace, scope):
+    """
+        Decide if the value lists of the attributes are downloaded ahead
+        of the translation. Small scopes usually contain only a fraction
+        of the values, which are cheaper to look up one by one.
+
+        Parameter:
+            namespace [Namespace]   : Parsed command line arguments
+            scope [Dict]            : Breadth of the data pull
+
+        Return:
+            [Bool]
+    """
+    if namespace.prefetch == 'auto':
+        return scope['name'] == 'all'
+    return namespace.prefetch == 'on'
+
+
+def load_engine(name):
+    """
+        Import the implementation of the bulk API requests.
+
+        Parameter:
+            name [String] : sync/async
+
+        Return:
+            [Module] : plentyapi or asyncapi
+    """
+    if name == 'sync':
+        return pa
+    try:
+        import plenty_attribute_export.packages.asyncapi as aa
+    except ImportError as err:
+        print(f"ERROR: The async engine requires the aiohttp package => {err}")
+        sys.exit(1)
+    return aa
+
+
+def set_config_file(path):
+    """
+        Use a different configuration file, the cache, state and checkpoint
+        files are placed next to it.
+
+        Parameter:
+            path [String] : Path to the configuration file.
+    """
+    global CONFIG_FILE, CACHE_FILE, STATE_FILE, STORE_FILE
+    CONFIG_FILE = os.path.abspath(path)
+    CACHE_FILE = os.path.join(os.path.dirname(CONFIG_FILE),
+                              '.plenty_export_cache.sqlite')
+    STATE_FILE = os.path.join(os.path.dirname(CONFIG_FILE),
+                              '.plenty_export_state.json')
+    STORE_FILE = os.path.join(os.path.dirname(CONFIG_FILE),
+                              '.plenty_export_store.sqlite')
+
 
 def setup_config(path):
     """
@@ -143,29 +623,111 @@ def setup_config(path):
     with open(path, mode='w') as configfile:
         config.write(configfile)
 
+
 def edit_config(path):
+    """
+        Open the configuration in an editor.
+
+        Return:
+            [Bool] : True if the editor exited without an error
+    """
     if sys.platform == 'linux':
-        os.system(str(f'vim {path}'))
+        return os.system(str(f'vim {path}')) == 0
     elif sys.platform == 'win32':
-        os.system(str(f'notepad {path}'))
+        return os.system(str(f'notepad {path}')) == 0
+    return False
+
+
+def open_cache(config, namespace):
+    """
+        Open the persistent attribute cache, unless the user disabled it.
+        The time to live can be adjusted with the `cache_ttl_hours` option
+        of the configuration.
+
+        Parameter:
+            config [Config object]
+            namespace [Namespace] : Parsed command line arguments
+
+        Return:
+            [ValueCache] / None
+    """
+    if namespace.no_cache:
+        return None
+    ttl_hours = config['PLENTY'].getint('cache_ttl_hours',
+                                        fallback=DEFAULT_CACHE_TTL_HOURS)
+    return ca.ValueCache(path=CACHE_FILE, url=config['PLENTY']['url'],
+                         ttl=ttl_hours * 3600,
+                         refresh=namespace.refresh_cache)
+
+
+def open_store(config, namespace):
+    """
+        Open the local export store, when the user asked to save the export.
+
+        Return:
+            [ExportStore] / None
+    """
+    if not namespace.store:
+        return None
+    return st.ExportStore(path=STORE_FILE, url=config['PLENTY']['url'])
+
+
+def close_store(store, scope, started_at, complete=True):
+    """
+        Remove the variations missing from a complete export (scope all)
+        and report the size of the store.
+
+        Parameter:
+            store [ExportStore]
+            scope [Dict]        : User defined options about the breadth of
+                                  the data pull
+            started_at [Int]    : UNIX timestamp of the start of the export
+            complete [Bool]     : False if variation pages failed, the
+                                  variations of these pages are not missing
+    """
+    if scope['name'] == 'all' and complete:
+        removed = store.remove_older(exported_at=started_at)
+        if removed:
+            print(f"Removed {removed} deleted variations from the store.")
+    variations, _ = store.summary()
+    print(f"Saved the export to {STORE_FILE} ({variations} variations)")
+    store.close()
 
-def get_attribute_ids(config, headers):
+
+def get_attribute_ids(config, headers, cache=None, selection=None,
+                      interactive=True):
     """
         Let the user choose, which attributes to include into the dataset.
-        These can also be chosen within the config file.
+        These can also be chosen within the config file or with the
+        attributes option (selection), which is not saved to the config.
 
         Parameter:
             config [Config object]
             headers [Dict] : HTTP headers used for the plenty API request.
+            cache [ValueCache] : Optional persistent attribute cache
+            selection [String] : Comma separated attribute IDs
+            interactive [Bool] : Ask for the attributes if none are chosen
 
         Return:
             [Dict] : Raw response data from the get attribute IDs request.
     """
-    attributes = pa.plenty_api_get_attribute_ids(
-        url=config['PLENTY']['url'], headers=headers)
+    attributes = cache.get_attributes() if cache else None
+    if not attributes:
+        attributes = pa.plenty_api_get_attribute_ids(
+            url=config['PLENTY']['url'], headers=headers)
+        if cache:
+            cache.set_attributes(attributes=attributes)
     if not attributes:
+        # without attributes the export would silently lack their columns
         print(f"ERROR: No attribute IDs found")
+        sys.exit(1)
 
+    if selection:
+        config['PLENTY']['attribute_ids'] = selection
+    if not config['PLENTY']['attribute_ids'] and not interactive:
+        print("ERROR: No attributes chosen, use [--attributes] or the "
+              "attribute_ids option of the configuration.")
+        sys.exit(1)
     if not config['PLENTY']['attribute_ids']:
         print("Found the following plenty attributes, choose by letter:")
         for index, attribute in enumerate(attributes):
@@ -183,8 +745,10 @@ def get_attribute_ids(config, headers):
             config.write(configfile)
     return attributes
 
-def build_output_name(name):
-    """ Create the file path for the CSV creation """
+
+def build_output_name(name, extension='.csv'):
+    """ Create the file path for the export file """
+    import easygui
     while True:
         path = easygui.diropenbox()
         if not path:
@@ -198,70 +762,442 @@ def build_output_name(name):
         else:
             break
     date = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M")
-    filetype = '.csv'
-    name = date + '_' + name + filetype
+    name = date + '_' + name + extension
     return os.path.join(os.getcwd(), name)
 
+
+def open_checkpoint(config, scope, namespace):
+    """
+        Create the checkpoint of the export, when the user asked to resume
+        an export, the progress of the matching checkpoint is restored.
+
+        Parameter:
+            config [Config object]
+            scope [Dict]            : User defined options about the breadth
+                                      of the data pull
+            namespace [Namespace]   : Parsed command line arguments
+
+        Return:
+            [Checkpoint]
+    """
+    url = config['PLENTY']['url']
+    path = cp.checkpoint_path(directory=os.path.dirname(CONFIG_FILE), url=url)
+    if os.path.exists(path) and not namespace.resume:
+        print("Found an unfinished export, starting a new one "
+              "(use --resume to continue an export).")
+    signature = {'url': url, 'scope': scope,
+                 'attribute_ids': config['PLENTY']['attribute_ids'],
+                 'items_per_page': namespace.items_per_page}
+    return cp.Checkpoint(path=path, signature=signature,
+                         resume=namespace.resume)
+
+
+def get_output_path(scope_name, extension='.csv', output=None):
+    """
+        Get the location of the export file, ask the user for it, unless
+        it was given with the output option.
+    """
+    if output:
+        return output
+    try:
+        return build_output_name(name=str(f"Attribute_{scope_name}"),
+                                 extension=extension)
+    except Exception as err:
+        print(f"ERROR: couldn't build output name => {err}")
+        import easygui
+        return easygui.filesavebox()
+
+
+def print_summary(url, cache, namespace):
+    """
+        Report the cache usage and the time spent waiting for the API,
+        with the profile option the timings of the phases and endpoints.
+    """
+    if cache:
+        print(cache.summary())
+        cache.close()
+    print(cl.get_client(url).limiter.summary())
+    if namespace.profile:
+        print(mt.METRICS.summary())
+    if namespace.profile_output:
+        mt.METRICS.dump(path=namespace.profile_output)
+        print(f"Saved the request timings to {namespace.profile_output}")
+
+
+def strip_options(argv, options):
+    """
+        Remove options with a value from the command line arguments.
+
+        Parameter:
+            argv [List]     : Command line arguments
+            options [Tuple] : Long names of the options
+
+        Return:
+            [List]
+    """
+    stripped = []
+    skip = False
+    for argument in argv:
+        if skip:
+            skip = False
+        elif argument in options:
+            skip = True
+        elif argument.split('=')[0] not in options:
+            stripped.append(argument)
+    return stripped
+
+
+def export_profiles(namespace):
+    """
+        Export every configuration profile in its own process, with the
+        remaining command line arguments, and print the timings per profile.
+
+        Parameter:
+            namespace [Namespace]   : Parsed command line arguments
+
+        Return:
+            [Int] : Exit status, 1 if the export of any profile failed
+    """
+    extension = out.file_extension(fmt=namespace.output_format,
+                                   compression=namespace.compression)
+    argv = strip_options(argv=sys.argv[1:], options=PROFILE_OPTIONS)
+    profiles = []
+    for path in namespace.profiles:
+        name = sc.profile_name(path)
+        output = os.path.join(
+            namespace.output,
+            str(f"{name}_Attribute_{namespace.scope_name}{extension}"))
+        profile_argv = argv + ['--headless', '--config-file', path,
+                               '--output', output]
+        if namespace.profile_output:
+            base, suffix = os.path.splitext(namespace.profile_output)
+            profile_argv += ['--profile-output',
+                             str(f"{base}_{name}{suffix}")]
+        profiles.append({'name': name, 'argv': profile_argv,
+                         'log': os.path.join(namespace.output,
+                                             str(f"{name}.log"))})
+    started = time.monotonic()
+    summaries = sc.run_profiles(export=cli, profiles=profiles,
+                                max_requests=namespace.max_requests)
+    print(sc.format_summary(summaries=summaries,
+                            wall_time=time.monotonic() - started))
+    return int(any(summary['status'] != 0 for summary in summaries))
+
+
+def create_query_argparser(argv):
+    """
+        Set up the argument parser of the query command, which answers
+        lookups from the local export store.
+
+        Parameter:
+            argv [List] : Command line arguments after `query`
+
+        Return:
+            [Namespace]
+    """
+    argparser = argparse.ArgumentParser(
+        prog='plenty_attribute_export query',
+        description='Look up variations and attribute values in the local '
+                    'export store (see --store), without any API request.')
+    lookup = argparser.add_mutually_exclusive_group(required=True)
+    lookup.add_argument('--value', type=int, help='Variations using the '
+                        'attribute value ID', dest='value_id')
+    lookup.add_argument('--variation', type=int, help='Attribute values of '
+                        'the variation ID', dest='variation_id')
+    lookup.add_argument('--number', help='Attribute values of the variation '
+                        'number', dest='variation_number')
+    lookup.add_argument('--item', type=int, help='Attribute values of the '
+                        'variations of the item ID', dest='item_id')
+    lookup.add_argument('--sku', help='Attribute values of the variations '
+                        'with the parent SKU', dest='parent_sku')
+    lookup.add_argument('--name', type=int, help='Names of the attribute '
+                        'value ID', dest='name')
+    argparser.add_argument(
+        '-l', '--lang', default=None, type=parse_languages,
+        help='Only show the names in these languages, comma separated',
+        dest='langs')
+    argparser.add_argument(
+        '--tsv', action='store_true',
+        help='Print tab separated values instead of a table',
+        dest='tsv')
+    argparser.add_argument(
+        '--config-file', default=None,
+        help='Location of the configuration file (default: {0})'
+             .format(CONFIG_FILE),
+        dest='config_file')
+    return argparser.parse_args(argv)
+
+
+def print_rows(headers, rows, tsv=False):
+    if tsv:
+        print('\t'.join(headers))
+        for row in rows:
+            print('\t'.join('' if value is None else str(value)
+                            for value in row))
+        return
+    import tabulate
+    print(tabulate.tabulate(rows, headers=headers, tablefmt='simple'))
+
+
+def query(argv):
+    """
+        Answer a lookup from the local export store of the shop of the
+        configuration.
+
+        Parameter:
+            argv [List] : Command line arguments after `query`
+
+        Return:
+            [Int] : Exit status, 1 if nothing was found
+    """
+    namespace = create_query_argparser(argv=argv)
+    if namespace.config_file:
+        set_config_file(path=namespace.config_file)
+    if not os.path.exists(CONFIG_FILE):
+        print(f"ERROR: No configuration found at {CONFIG_FILE}")
+        return 1
+    if not os.path.exists(STORE_FILE):
+        print(f"ERROR: No export store found at {STORE_FILE}, save an "
+              "export with [--store] first.")
+        return 1
+    config = configparser.ConfigParser()
+    config.read(CONFIG_FILE)
+    store = st.ExportStore(path=STORE_FILE, url=config['PLENTY']['url'])
+    if namespace.name:
+        names = store.value_names(value_ids=[namespace.name],
+                                  langs=namespace.langs)
+        rows = [(value_id, lang, name)
+                for (value_id, lang), name in names.items()]
+        headers = ['value-id', 'lang', 'name']
+    else:
+        key = next(key for key in ('value_id', 'variation_id',
+                                   'variation_number', 'item_id',
+                                   'parent_sku')
+                   if getattr(namespace, key) is not None)
+        rows = store.find_variations(key=key, value=getattr(namespace, key))
+        names = store.value_names(
+            value_ids={row[5] for row in rows if row[5] is not None},
+            langs=namespace.langs)
+        langs = namespace.langs or sorted({lang for _, lang in names})
+        rows = [row + tuple(names.get((row[5], lang), '') for lang in langs)
+                for row in rows]
+        headers = ['variation-id', 'variation-number', 'item-id',
+                   'parent-variation', 'attribute', 'value-id',
+                   'value'] + langs
+    store.close()
+    if not rows:
+        print("Nothing found in the export store.")
+        return 1
+    try:
+        print_rows(headers=headers, rows=rows, tsv=namespace.tsv)
+        sys.stdout.flush()
+    except BrokenPipeError:
+        # the reader of the pipe exited early (e.g. head)
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+    return 0
+
+
 def cli():
     """
         Load the argument and configuration data.
         Make the appropriate requests to fill the data set.
         And the print it to a file or stdout.
     """
+    if sys.argv[1:2] == ['query']:
+        sys.exit(query(argv=sys.argv[2:]))
     argparser = create_argparser()
+    headless = argparser['namespace'].headless
+    console = None
+    if writes_stdout(namespace=argparser['namespace']):
+        # only the export is written to stdout, to pipe it into other tools
+        console = sys.stdout
+        sys.stdout = sys.stderr
+    if argparser['namespace'].profiles:
+        sys.exit(export_profiles(namespace=argparser['namespace']))
 
+    if argparser['namespace'].config_file:
+        set_config_file(path=argparser['namespace'].config_file)
     if not os.path.exists(CONFIG_FILE):
+        if headless:
+            print(f"ERROR: No configuration found at {CONFIG_FILE}")
+            sys.exit(1)
         setup_config(path=CONFIG_FILE)
+    if argparser['namespace'].configuration:
+        if not edit_config(path=CONFIG_FILE):
+            sys.exit(1)
+        sys.exit(0)
     config = configparser.ConfigParser()
     config.read(CONFIG_FILE)
     url = config['PLENTY']['url']
 
+    cl.configure(pool_size=argparser['namespace'].pool_size,
+                 timeout=argparser['namespace'].timeout,
+                 retries=argparser['namespace'].retries)
+    if argparser['namespace'].profile or argparser['namespace'].profile_output:
+        mt.METRICS.enabled = True
+    mt.METRICS.start_phase('login')
+    credentials = kr.load_credentials(
+        path=argparser['namespace'].credentials or
+        config['PLENTY'].get('credentials_file'))
+    kr.configure(credentials=credentials, interactive=not headless)
     headers = pa.plenty_api_login(url=url)
     if not headers:
         sys.exit(1)
 
-    if argparser['namespace'].configuration:
-        if not edit_config(path=CONFIG_FILE):
+    mt.METRICS.start_phase('attributes')
+    cache = open_cache(config=config, namespace=argparser['namespace'])
+    raw_attributes = get_attribute_ids(
+        config=config, headers=headers, cache=cache,
+        selection=argparser['namespace'].attribute_ids,
+        interactive=not headless)
+
+    previous = None
+    if argparser['namespace'].incremental:
+        state, previous = load_previous_export(
+            config=config, attributes=raw_attributes,
+            langs=argparser['namespace'].langs)
+        if state:
+            argparser['scope']['args']['updated_since'] =\
+                state['updated_since']
+    started_at = int(time.time())
+
+    api = load_engine(name=argparser['namespace'].engine)
+    if argparser['namespace'].engine == 'async':
+        concurrency = argparser['namespace'].max_inflight
+    else:
+        concurrency = argparser['namespace'].workers
+
+    selected_attributes = pa.get_selected_attributes(attributes=raw_attributes,
+                                                     config=config)
+    checkpoint = None
+    if not argparser['namespace'].stream:
+        checkpoint = open_checkpoint(config=config, scope=argparser['scope'],
+                                     namespace=argparser['namespace'])
+    resolver = tr.TranslationResolver(url=url, headers=headers, cache=cache,
+                                      api=api, workers=concurrency,
+                                      checkpoint=checkpoint)
+    if use_prefetch(namespace=argparser['namespace'],
+                    scope=argparser['scope']):
+        mt.METRICS.start_phase('prefetch')
+        prefetched = resolver.prefetch(
+            attributes=selected_attributes,
+            langs=argparser['namespace'].langs,
+            items_per_page=argparser['namespace'].items_per_page,
+            workers=argparser['namespace'].workers)
+        print(f"Prefetched {prefetched} attribute value names.")
+
+    extension = out.file_extension(
+        fmt=argparser['namespace'].output_format,
+        compression=argparser['namespace'].compression)
+    store = open_store(config=config, namespace=argparser['namespace'])
+    if argparser['namespace'].stream:
+        output_path = 'stdout'
+        if not console:
+            output_path = get_output_path(
+                scope_name=argparser['scope']['name'], extension=extension,
+                output=argparser['namespace'].output)
+        mt.METRICS.start_phase('stream')
+        failed_pages = []
+        written = stream_export(
+            url=url, headers=headers, config=config, scope=argparser['scope'],
+            namespace=argparser['namespace'], attributes=selected_attributes,
+            resolver=resolver, output_path=output_path, api=api,
+            workers=concurrency, console=console, store=store,
+            exported_at=started_at, failed_pages=failed_pages)
+        print(f"Wrote {written} variations to {output_path}")
+        if store:
+            close_store(store=store, scope=argparser['scope'],
+                        started_at=started_at, complete=not failed_pages)
+        if failed_pages:
+            print("ERROR: Failed variation pages: {0}, the export is "
+                  "incomplete.".format(pa.format_pages(failed_pages)))
             sys.exit(1)
-        sys.exit(0)
+        print_summary(url=url, cache=cache, namespace=argparser['namespace'])
+        return
+
+    mt.METRICS.start_phase('variations')
+    failed_pages = []
+    frame = api.plenty_api_get_variations(
+        url=url, headers=headers, config=config, scope=argparser['scope'],
+        items_per_page=argparser['namespace'].items_per_page,
+        workers=concurrency, checkpoint=checkpoint, attributes=raw_attributes,
+        failed_pages=failed_pages)
+    if failed_pages:
+        # the checkpoint is kept, so that --resume only fetches the gaps,
+        # an incremental export keeps its previous snapshot and state
+        print("ERROR: Failed variation pages: {0}, nothing was written, "
+              "continue the export with --resume."
+              .format(pa.format_pages(failed_pages)))
+        checkpoint.close()
+        sys.exit(1)
     if argparser['scope']['name'] == 'variation':
-        item = pa.plenty_api_get_itemid_for_variation(
-            url=url, headers=headers,
-            variation=argparser['scope']['args']['variation'])
-        if not item:
-            print("ERROR: No ItemID found for variation: {0}"
-                  .format(argparser['scope']['args']['variation']))
-            sys.exit(1)
-        argparser['scope']['args']['item'] = item
-    raw_attributes = get_attribute_ids(config=config, headers=headers)
-    attribute_ids = config['PLENTY']['attribute_ids'].split(',')
-
-    frame = pa.plenty_api_get_variations(
-        url=url, headers=headers, config=config, scope=argparser['scope'])
-    get_parent_sku(url=url, headers=headers,
-                   config=config, data=frame)
-    progress = pro.Progressbar(size=80, prefix='Get Translation..')
-
-    for attribute in raw_attributes:
-        if str(attribute['id']) in attribute_ids:
-            progress.prefix = str(f"Get {attribute['name']} translation")
-            progress.count =\
-                len(frame[frame[attribute['name'] + '_name'] != ''].values)
-            frame[attribute['name'] + '_lang'] =\
-                frame[attribute['name'] + '_id'].apply(
-                    lambda x: pa.plenty_api_get_attribute_value_for_language(
-                        url=url, headers=headers, value_id=x,
-                        lang=argparser['namespace'].lang,
-                        signal=progress))
-
-    if not argparser['namespace'].stdout or argparser['scope']['name'] == 'all':
+        check_variations(variations=argparser['scope']['args']['variation'],
+                         frame=frame)
+    mt.METRICS.start_phase('parent_skus')
+    get_parent_sku(url=url, headers=headers, config=config, data=frame,
+                   workers=concurrency, api=api, checkpoint=checkpoint)
+    mt.METRICS.start_phase('translations')
+    from plenty_attribute_export.packages.progress import Progressbar
+    progress = Progressbar(size=40, prefix='Get Translation..',
+                           unit='requests')
+    resolver.apply(frame=frame, attributes=selected_attributes,
+                   langs=argparser['namespace'].langs, signal=progress)
+    progress.finish()
+
+    if previous is not None:
+        mt.METRICS.start_phase('incremental')
+        existing_ids = None
+        if argparser['namespace'].detect_deletions:
+            existing_ids = pa.plenty_api_get_variation_ids(
+                url=url, headers=headers,
+                items_per_page=argparser['namespace'].items_per_page,
+                workers=argparser['namespace'].workers)
+            if existing_ids is None:
+                # a partial listing would drop live variations for good
+                print("ERROR: Could not detect the deleted variations, the "
+                      "previous export and its state are kept.")
+                sys.exit(1)
+        print(f"Merging {len(frame.index)} changed variations.")
+        frame = inc.merge_frames(previous=previous, changed=frame,
+                                 existing_ids=existing_ids)
+
+    mt.METRICS.start_phase('write')
+    if not console:
+        output_path = get_output_path(scope_name=argparser['scope']['name'],
+                                      extension=extension,
+                                      output=argparser['namespace'].output)
         try:
-            output_path = build_output_name(
-                name=str(f"Attribute_{argparser['scope']['name']}"))
-        except Exception as err:
-            print(f"ERROR: couldn't build output name => {err}")
-            output_path = easygui.filesavebox()
-        frame.to_csv(output_path, sep=';', index=False)
-    elif argparser['namespace'].stdout:
-        print(tabulate.tabulate(frame, headers='keys', tablefmt='fancygrid',
-                                showindex=False))
+            out.write_frame(frame=frame, path=output_path,
+                            fmt=argparser['namespace'].output_format,
+                            compression=argparser['namespace'].compression)
+        except ImportError as err:
+            print("ERROR: The {0} format requires the pyarrow package => {1}"
+                  .format(argparser['namespace'].output_format, err))
+            sys.exit(1)
+    else:
+        fmt = out.stdout_format(fmt=argparser['namespace'].stdout_format,
+                                rows=len(frame.index), tty=console.isatty())
+        if fmt == 'table':
+            import tabulate
+            console.write(tabulate.tabulate(
+                pa.frame_to_text(frame), headers='keys',
+                tablefmt='fancygrid', showindex=False) + '\n')
+        else:
+            out.StdoutWriter(file=console, fmt=fmt).write_frame(frame=frame)
+
+    if argparser['namespace'].incremental:
+        snapshot = inc.snapshot_path(directory=os.path.dirname(CONFIG_FILE),
+                                     url=url)
+        inc.write_snapshot(frame=frame, path=snapshot)
+        inc.save_state(path=STATE_FILE, url=url, updated_since=started_at,
+                       snapshot=snapshot)
+
+    if store:
+        mt.METRICS.start_phase('store')
+        store.update(frame=frame, langs=argparser['namespace'].langs,
+                     exported_at=started_at)
+        close_store(store=store, scope=argparser['scope'],
+                    started_at=started_at)
+
+    checkpoint.complete()
+    print_summary(url=url, cache=cache, namespace=argparser['namespace'])
@@ -0,0 +1,349 @@
+"""
+    Author: Sebastian Fricke (Panasiam)
+    Date: 2020-07-30
+    License: GPLv3
+
+    Asynchronous implementation of the bulk calls to the PlentyMarkets API
+    (variation pages, parent SKUs and attribute value names).
+    The functions mirror the interface of the plentyapi module and produce
+    the same data, but keep a large amount of requests in flight within a
+    single thread. Requires the optional aiohttp package.
+"""
+import asyncio
+import atexit
+import functools
+import threading
+import aiohttp
+
+import plenty_attribute_export.packages.plentyapi as pa
+import plenty_attribute_export.packages.client as cl
+from plenty_attribute_export.packages.client import RETRY_STATUS, get_client
+from plenty_attribute_export.packages.metrics import METRICS
+
+DEFAULT_MAX_INFLIGHT = 100
+# Seconds between two attempts to get a slot of the global request limit
+SLOT_POLL_INTERVAL = 0.005
+RUNNERS = {}
+RUNNERS_LOCK = threading.Lock()
+
+
+class AsyncPlentyClient():
+    """
+        Asynchronous counterpart of the PlentyClient, it shares the call
+        limiter and the retry settings with the client of the same shop.
+
+        Parameter:
+            url [String]        : Base URL of the shop provided by the config
+            max_inflight [Int]  : Maximum amount of open connections
+    """
+    def __init__(self, url, max_inflight):
+        self.url = url
+        self.max_inflight = max_inflight
+        sync_client = get_client(url)
+        self.sync_client = sync_client
+        self.limiter = sync_client.limiter
+        self.timeout = sync_client.timeout
+        self.retries = sync_client.retries
+        self.backoff = sync_client.backoff
+        self.session = None
+
+    async def __aenter__(self):
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.max_inflight),
+            timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self
+
+    async def __aexit__(self, *args):
+        await self.session.close()
+
+    async def get_json(self, route, headers):
+        """
+            Send a GET request and parse the response to JSON, retry on
+            connection errors, timeouts and the status codes in RETRY_STATUS
+            (waiting at least for the Retry-After header of the response).
+            A rejected token (401) is renewed once through the sync client,
+            within a thread of the default executor.
+            The request is recorded in the metrics (see METRICS).
+
+            Return:
+                [Dict/List] : Parsed response, None if it is not valid JSON
+                              or an error response (outside of 2xx)
+        """
+        endpoint = self.url + route
+        reauthenticated = False
+        attempt = 0
+        loop = asyncio.get_running_loop()
+        loop_time = loop.time
+        started = loop_time()
+        while True:
+            sent = headers.get('Authorization')
+            ticket = 0
+            while not ticket:
+                delay, ticket = self.limiter.acquire()
+                if delay:
+                    await asyncio.sleep(delay)
+            slots = cl.REQUEST_SLOTS
+            if slots:
+                # polling keeps the event loop free and a cancelled task
+                # never holds a slot of the other processes
+                while not slots.acquire(block=False):
+                    await asyncio.sleep(SLOT_POLL_INTERVAL)
+            sent_at = loop_time()
+            retry_after = ''
+            try:
+                async with self.session.get(endpoint,
+                                            headers=headers) as response:
+                    body = await response.read()
+                    latency = loop_time() - sent_at
+                    self.limiter.update(headers=response.headers,
+                                        ticket=ticket)
+                    if response.status == 401 and not reauthenticated:
+                        reauthenticated = True
+                        # the login is a blocking request of the sync client
+                        if await loop.run_in_executor(None, functools.partial(
+                                self.sync_client.reauthenticate,
+                                headers=headers, sent=sent)):
+                            continue
+                    if response.status not in RETRY_STATUS or\
+                            attempt >= self.retries:
+                        METRICS.record_request(
+                            method='GET', endpoint=endpoint,
+                            status=response.status, latency=latency,
+                            elapsed=loop_time() - started, size=len(body),
+                            retries=attempt + int(reauthenticated))
+                        if not 200 <= response.status < 300:
+                            return None
+                        try:
+                            return await response.json(content_type=None)
+                        except ValueError:
+                            return None
+                    retry_after = response.headers.get('Retry-After', '')
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if attempt >= self.retries:
+                    METRICS.record_request(
+                        method='GET', endpoint=endpoint, status=0,
+                        latency=loop_time() - sent_at,
+                        elapsed=loop_time() - started, size=0,
+                        retries=attempt + int(reauthenticated))
+                    raise
+            finally:
+                if slots:
+                    slots.release()
+            delay = self.backoff * 2 ** attempt
+            if retry_after.isdigit():
+                delay = max(delay, int(retry_after))
+            await asyncio.sleep(delay)
+            attempt += 1
+
+
+class ClientRunner():
+    """
+        Event loop and client of a shop, which are kept for the whole run,
+        so that every batch of requests reuses the open connections of the
+        same session.
+
+        Parameter:
+            url [String]        : Base URL of the shop provided by the config
+            max_inflight [Int]  : Maximum amount of open connections
+    """
+    def __init__(self, url, max_inflight):
+        self.loop = asyncio.new_event_loop()
+        self.client = AsyncPlentyClient(url=url, max_inflight=max_inflight)
+        self.loop.run_until_complete(self.client.__aenter__())
+
+    def run(self, coroutine):
+        return self.loop.run_until_complete(coroutine)
+
+    def close(self):
+        self.loop.run_until_complete(self.client.__aexit__(None, None, None))
+        self.loop.close()
+
+
+def get_runner(url, workers):
+    """
+        Get the runner of a shop, create it on the first usage. The amount
+        of open connections is fixed by the first call.
+
+        Return:
+            [ClientRunner]
+    """
+    with RUNNERS_LOCK:
+        if url not in RUNNERS:
+            RUNNERS[url] = ClientRunner(url=url, max_inflight=workers)
+        return RUNNERS[url]
+
+
+@atexit.register
+def close_runners():
+    with RUNNERS_LOCK:
+        for runner in RUNNERS.values():
+            runner.close()
+        RUNNERS.clear()
+
+
+def run_with_client(url, workers, function, **kwargs):
+    """
+        Run the coroutine function with the client of the shop in the event
+        loop of the run and return its result.
+    """
+    runner = get_runner(url=url, workers=workers)
+    return runner.run(function(client=runner.client, workers=workers,
+                               **kwargs))
+
+
+async def get_variation_pages(client, headers, scope, items_per_page,
+                              workers, skip_pages, handle_page,
+                              failed_pages=None, progress=None):
+    page_route = '{0}&page={1}&itemsPerPage={2}'
+    semaphore = asyncio.Semaphore(workers)
+
+    async def fetch(route, page):
+        async with semaphore:
+            response = await client.get_json(
+                route=page_route.format(route, page, items_per_page),
+                headers=headers)
+        if not response:
+            print(f'ERROR: No response for request: {route}')
+        return response
+
+    async def fetch_page(index, route, page):
+        response = await fetch(route, page)
+        if response and progress:
+            progress.increment(len(response['entries']))
+        return (index, page), response
+
+    routes = pa.get_routes(scope=scope)
+    if progress:
+        progress.start()
+    first_pages = await asyncio.gather(*[fetch(route, 1) for route in routes])
+    total = sum(response['totalsCount'] for response in first_pages
+                if response)
+    if progress:
+        progress.count = total
+    tasks = []
+    for index, (route, response) in enumerate(zip(routes, first_pages)):
+        if not response:
+            if failed_pages is not None:
+                failed_pages.append((index, 1))
+            continue
+        if (index, 1) not in skip_pages:
+            if progress:
+                progress.increment(len(response['entries']))
+            handle_page(total=total, page=(index, 1),
+                        entries=response['entries'])
+        tasks += [asyncio.ensure_future(fetch_page(index, route, page))
+                  for page in range(2, response['lastPageNumber'] + 1)
+                  if (index, page) not in skip_pages]
+
+    # every page is handled as soon as it arrives, so that an interrupted
+    # export keeps the pages, which were already downloaded
+    try:
+        for finished in asyncio.as_completed(tasks):
+            page, response = await finished
+            if response:
+                handle_page(total=total, page=page,
+                            entries=response['entries'])
+            elif failed_pages is not None:
+                failed_pages.append(page)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def plenty_api_get_variations(url, headers, config, scope,
+                              items_per_page=pa.DEFAULT_ITEMS_PER_PAGE,
+                              workers=DEFAULT_MAX_INFLIGHT, checkpoint=None,
+                              attributes=None, failed_pages=None):
+    """
+        Asynchronous version of plentyapi.plenty_api_get_variations,
+        all pages after the first one are requested at the same time
+        (limited by workers).
+    """
+    if attributes is None:
+        attributes = pa.plenty_api_get_attribute_ids(url=url, headers=headers)
+    extractor = pa.RowExtractor(attributes=attributes, config=config)
+
+    pages = dict(checkpoint.pages) if checkpoint else {}
+    offset = sum(checkpoint.entries.values()) if checkpoint else 0
+    pa.get_progress().restore(done=offset)
+
+    def handle_page(total, page, entries):
+        nonlocal offset
+        pages[page] = extractor.new_buffers()
+        extractor.extract(entries=entries, buffers=pages[page], offset=offset)
+        offset += len(entries)
+        if checkpoint:
+            checkpoint.add_page(page=page, buffers=pages[page],
+                                entries=len(entries))
+
+    run_with_client(url=url, workers=workers, function=get_variation_pages,
+                    headers=headers, scope=scope,
+                    items_per_page=items_per_page,
+                    skip_pages=set(pages.keys()), handle_page=handle_page,
+                    failed_pages=failed_pages, progress=pa.get_progress())
+    pa.get_progress().finish()
+    buffers = pa.merge_buffers(pages=pages) or extractor.new_buffers()
+    return extractor.build_frame(buffers=buffers)
+
+
+async def get_market_skus(client, headers, config, variations, workers):
+    semaphore = asyncio.Semaphore(workers)
+
+    async def fetch(item, variation_id):
+        route = str(
+            f'/rest/items/{item}/variations/{variation_id}/variation_skus')
+        async with semaphore:
+            response = await client.get_json(route=route, headers=headers)
+        if response is None:
+            print(f'ERROR: No response for request: {route}')
+            return 'Not found'
+        return pa.get_market_parent_sku(response=response, config=config)
+
+    items = list(variations.keys())
+    results = await asyncio.gather(
+        *[fetch(item, variations[item]) for item in items])
+    return dict(zip(items, results))
+
+
+def plenty_api_get_market_skus(url, headers, config, variations,
+                               workers=DEFAULT_MAX_INFLIGHT):
+    """
+        Asynchronous version of plentyapi.plenty_api_get_market_skus.
+    """
+    return run_with_client(url=url, workers=workers,
+                           function=get_market_skus, headers=headers,
+                           config=config, variations=variations)
+
+
+async def get_attribute_value_names(client, headers, pairs, signal, workers):
+    semaphore = asyncio.Semaphore(workers)
+
+    async def fetch(value_id, lang):
+        route = str(f'/rest/items/attribute_values/{value_id}/names/{lang}')
+        if signal:
+            signal.increment()
+        async with semaphore:
+            response = await client.get_json(route=route, headers=headers)
+        if response is None:
+            print(f'''ERROR: No response for request:
+              get value name for attributeValue: {value_id} in language: {lang}
+              ''')
+            return 'Not found'
+        if not 'name' in response:
+            return 'Not found'
+        return response['name']
+
+    results = await asyncio.gather(
+        *[fetch(value_id, lang) for value_id, lang in pairs])
+    return dict(zip(pairs, results))
+
+
+def plenty_api_get_attribute_value_names(url, headers, pairs, signal=None,
+                                         workers=DEFAULT_MAX_INFLIGHT):
+    """
+        Asynchronous version of plentyapi.plenty_api_get_attribute_value_names.
+    """
+    return run_with_client(url=url, workers=workers,
+                           function=get_attribute_value_names,
+                           headers=headers, pairs=list(pairs), signal=signal)
@@ -0,0 +1,173 @@
+"""
+    Author: Sebastian Fricke (Panasiam)
+    Date: 2020-07-30
+    License: GPLv3
+
+    Persistent cache for attribute data, which rarely changes within
+    PlentyMarkets (attribute lists and translated attribute value names).
+"""
+import sqlite3
+import time
+import simplejson
+
+from plenty_attribute_export.packages.metrics import METRICS
+
+# Seconds to wait for the write lock of another process (multi-profile
+# exports of the same folder share the file)
+SQLITE_TIMEOUT = 60
+
+
+class ValueCache():
+    """
+        SQLite backed cache, keyed by the shop URL so that a single cache
+        file can serve multiple PlentyMarkets systems.
+
+        Parameter:
+            path [String]   : Location of the SQLite file
+            url [String]    : Base URL of the shop provided by the config
+            ttl [Int]       : Seconds until a cached entry becomes invalid
+            refresh [Bool]  : Ignore existing entries and overwrite them
+                              with fresh data from the API
+    """
+    def __init__(self, path, url, ttl, refresh=False):
+        self.url = url
+        self.ttl = ttl
+        self.refresh = refresh
+        self.hits = 0
+        self.misses = 0
+        self.connection = sqlite3.connect(path, timeout=SQLITE_TIMEOUT)
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS value_names (
+                url TEXT NOT NULL,
+                value_id INTEGER NOT NULL,
+                lang TEXT NOT NULL,
+                name TEXT NOT NULL,
+                fetched_at REAL NOT NULL,
+                PRIMARY KEY (url, value_id, lang)
+            );
+            CREATE TABLE IF NOT EXISTS value_dictionaries (
+                url TEXT NOT NULL,
+                attribute_id INTEGER NOT NULL,
+                lang TEXT NOT NULL,
+                fetched_at REAL NOT NULL,
+                PRIMARY KEY (url, attribute_id, lang)
+            );
+            CREATE TABLE IF NOT EXISTS attributes (
+                url TEXT PRIMARY KEY,
+                payload TEXT NOT NULL,
+                fetched_at REAL NOT NULL
+            );
+        """)
+
+    def _oldest_valid(self):
+        return time.time() - self.ttl
+
+    def get_value_names(self, value_ids, lang):
+        """
+            Look up the translated names of the given value IDs.
+
+            Parameter:
+                value_ids [List]    : Attribute value IDs
+                lang [String]       : Language of the translation
+
+            Return:
+                [Dict] : Mapping of value ID to name for every cache hit
+        """
+        found = {}
+        if not self.refresh:
+            cursor = self.connection.cursor()
+            for value_id in value_ids:
+                cursor.execute(
+                    """SELECT name FROM value_names
+                       WHERE url = ? AND value_id = ? AND lang = ?
+                       AND fetched_at >= ?""",
+                    (self.url, int(value_id), lang, self._oldest_valid()))
+                row = cursor.fetchone()
+                if row:
+                    found[value_id] = row[0]
+        self.hits += len(found)
+        self.misses += len(value_ids) - len(found)
+        METRICS.record_cache(name='value_names', hits=len(found),
+                             misses=len(value_ids) - len(found))
+        return found
+
+    def set_value_names(self, names, lang):
+        """
+            Save the translated names of attribute values, failed lookups
+            ('Not found') are not cached to allow a retry on the next run.
+
+            Parameter:
+                names [Dict]    : Mapping of value ID to name
+                lang [String]   : Language of the translation
+        """
+        now = time.time()
+        rows = [(self.url, int(value_id), lang, name, now)
+                for value_id, name in names.items() if name != 'Not found']
+        with self.connection:
+            self.connection.executemany(
+                """INSERT OR REPLACE INTO value_names
+                   (url, value_id, lang, name, fetched_at)
+                   VALUES (?, ?, ?, ?, ?)""", rows)
+
+    def has_value_dictionary(self, attribute_id, lang):
+        """
+            Check if the names of all values of an attribute were saved
+            within the lifetime of the cache.
+
+            Parameter:
+                attribute_id [Int]  : ID of the attribute
+                lang [String]       : Language of the translation
+
+            Return:
+                [Bool]
+        """
+        if self.refresh:
+            return False
+        row = self.connection.execute(
+            """SELECT 1 FROM value_dictionaries
+               WHERE url = ? AND attribute_id = ? AND lang = ?
+               AND fetched_at >= ?""",
+            (self.url, int(attribute_id), lang,
+             self._oldest_valid())).fetchone()
+        return row is not None
+
+    def set_value_dictionary(self, attribute_id, lang):
+        """ Mark the value names of the attribute as completely saved. """
+        with self.connection:
+            self.connection.execute(
+                """INSERT OR REPLACE INTO value_dictionaries
+                   (url, attribute_id, lang, fetched_at) VALUES (?, ?, ?, ?)""",
+                (self.url, int(attribute_id), lang, time.time()))
+
+    def get_attributes(self):
+        """
+            Return:
+                [List] : Cached attribute list ({name, id}) or None
+        """
+        if not self.refresh:
+            row = self.connection.execute(
+                """SELECT payload FROM attributes
+                   WHERE url = ? AND fetched_at >= ?""",
+                (self.url, self._oldest_valid())).fetchone()
+            if row:
+                self.hits += 1
+                METRICS.record_cache(name='attributes', hits=1, misses=0)
+                return simplejson.loads(row[0])
+        self.misses += 1
+        METRICS.record_cache(name='attributes', hits=0, misses=1)
+        return None
+
+    def set_attributes(self, attributes):
+        if not attributes:
+            return
+        with self.connection:
+            self.connection.execute(
+                """INSERT OR REPLACE INTO attributes (url, payload, fetched_at)
+                   VALUES (?, ?, ?)""",
+                (self.url, simplejson.dumps(attributes), time.time()))
+
+    def summary(self):
+        return str(f"Cache: {self.hits} hits, {self.misses} misses")
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,136 @@
+"""
+    Author: Sebastian Fricke (Panasiam)
+    Date: 2020-07-30
+    License: GPLv3
+
+    Save the progress of an export (completed variation pages, resolved
+    parent SKUs and translations) to a local file, so that an interrupted
+    export can be continued instead of starting over.
+"""
+import os
+import hashlib
+import simplejson
+
+# Amount of lookups, which are requested between two checkpoint records
+BATCH_SIZE = 500
+# Format of the records, checkpoints of another format are not resumed
+VERSION = 2
+
+
+class Checkpoint():
+    """
+        Append-only JSON lines file, every finished unit of work is written
+        as a single line. A line, which was cut off by a crash, is ignored
+        when the file is loaded again.
+
+        Parameter:
+            path [String]       : Location of the checkpoint file
+            signature [Dict]    : Options, that have to be identical for
+                                  continuing an export (URL, scope, ...),
+                                  extended by the VERSION of the format
+            resume [Bool]       : Load the progress of a previous export
+                                  with the same signature
+    """
+    def __init__(self, path, signature, resume=False):
+        self.path = path
+        self.signature = dict(signature, version=VERSION)
+        self.pages = {}
+        self.entries = {}
+        self.skus = {}
+        self.names = {}
+        if resume and self._load():
+            print("Resuming export: {0} pages, {1} parent SKUs and {2} "
+                  "translations restored.".format(
+                      len(self.pages), len(self.skus), len(self.names)))
+            self.file = open(self.path, mode='a')
+        else:
+            self.file = open(self.path, mode='w')
+            self._write({'signature': self.signature})
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path, mode='r') as checkpoint_file:
+            lines = checkpoint_file.readlines()
+        records = []
+        for line in lines:
+            try:
+                records.append(simplejson.loads(line))
+            except simplejson.errors.JSONDecodeError:
+                continue
+        if not records or records[0].get('signature') != self.signature:
+            print("No checkpoint found for this export, starting over.")
+            return False
+        for record in records[1:]:
+            if 'page' in record:
+                page = tuple(record['page'])
+                self.pages[page] = record['buffers']
+                self.entries[page] = record['entries']
+            elif 'skus' in record:
+                self.skus.update(record['skus'])
+            elif 'names' in record:
+                for value_id, lang, name in record['names']:
+                    self.names[(value_id, lang)] = name
+        return True
+
+    def _write(self, record):
+        self.file.write(simplejson.dumps(record) + '\n')
+        self.file.flush()
+
+    def add_page(self, page, buffers, entries):
+        """
+            Parameter:
+                page [Tuple]    : Route index and number of the completed page
+                buffers [List]  : Column buffers of the page's variations
+                entries [Int]   : Amount of entries (incl. main variations)
+                                  of the page's response
+        """
+        self.pages[page] = buffers
+        self.entries[page] = entries
+        self._write({'page': list(page), 'buffers': buffers,
+                     'entries': entries})
+
+    def add_skus(self, skus):
+        """
+            Parameter:
+                skus [Dict] : Mapping of item ID (string) to parent SKU
+        """
+        if not skus:
+            return
+        self.skus.update(skus)
+        self._write({'skus': skus})
+
+    def add_names(self, names):
+        """
+            Parameter:
+                names [Dict] : Mapping of (value ID, language) to name
+        """
+        if not names:
+            return
+        self.names.update(names)
+        self._write({'names': [[int(value_id), lang, name] for
+                                (value_id, lang), name in names.items()]})
+
+    def complete(self):
+        """ Remove the checkpoint after a successful export. """
+        self.file.close()
+        os.remove(self.path)
+
+    def close(self):
+        self.file.close()
+
+
+def checkpoint_path(directory, url):
+    """
+        Location of the checkpoint file for a shop.
+
+        Parameter:
+            directory [String]  : Folder of the configuration file
+            url [String]        : Base URL of the shop provided by the config
+
+        Return:
+            [String]
+    """
+    shop = hashlib.md5(url.encode('utf-8')).hexdigest()[:8]
+    return os.path.join(directory,
+                        str(f'.plenty_export_checkpoint_{shop}.jsonl'))
@@ -0,0 +1,196 @@
+"""
+    Author: Sebastian Fricke (Panasiam)
+    Date: 2020-07-30
+    License: GPLv3
+
+    HTTP client for the PlentyMarkets REST API, that keeps the connections
+    to the shop alive and retries transient failures.
+"""
+import contextlib
+import threading
+import time
+import requests
+
+from plenty_attribute_export.packages.ratelimit import CallLimiter
+from plenty_attribute_export.packages.metrics import METRICS
+
+# Status codes of the API, that are worth another try after a short pause
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+CLIENT_SETTINGS = {
+    'pool_size': 10,
+    'timeout': 30,
+    'retries': 3,
+    'backoff': 0.5,
+    'reserve': 2
+}
+CLIENTS = {}
+CLIENTS_LOCK = threading.Lock()
+# Semaphore shared by the processes of a multi-profile export, that caps
+# the total amount of concurrent requests (see scheduler)
+REQUEST_SLOTS = None
+
+
+class PlentyClient():
+    """
+        Pooled session for a single PlentyMarkets system.
+
+        Parameter:
+            url [String]    : Base URL of the shop provided by the config
+            pool_size [Int] : Maximum amount of kept-alive connections
+            timeout [Float] : Seconds to wait for the connection/response
+            retries [Int]   : Additional attempts for a failed request
+            backoff [Float] : Base delay in seconds, doubled on every retry
+            reserve [Int]   : Calls of each call limit period, that are
+                              left unused (see CallLimiter)
+    """
+    def __init__(self, url, pool_size, timeout, retries, backoff, reserve):
+        self.url = url
+        self.limiter = CallLimiter(reserve=reserve)
+        # Called with the headers of a rejected request to renew the token
+        self.authenticator = None
+        self.auth_lock = threading.Lock()
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size,
+                                                pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def _wait_before_retry(self, attempt, response=None):
+        delay = self.backoff * 2 ** attempt
+        if response is not None:
+            retry_after = response.headers.get('Retry-After', '')
+            if retry_after.isdigit():
+                delay = max(delay, int(retry_after))
+        time.sleep(delay)
+
+    def reauthenticate(self, headers, sent):
+        """
+            Renew the authorization of the headers (in place) after the API
+            rejected a request. Concurrent requests rejected for the same
+            token trigger only a single renewal.
+
+            Parameter:
+                headers [Dict]  : HTTP header of the rejected request
+                sent [String]   : Authorization sent with the request
+
+            Return:
+                [Bool] : True if the request can be repeated
+        """
+        if not self.authenticator:
+            return False
+        with self.auth_lock:
+            if headers.get('Authorization') != sent:
+                return True
+            return self.authenticator(headers=headers)
+
+    def request(self, method, endpoint, **kwargs):
+        """
+            Send a request through the pooled session, connection errors,
+            timeouts and the status codes in RETRY_STATUS are retried.
+            Every attempt waits for the permission of the call limiter.
+            A request rejected with status 401 is repeated once with a
+            renewed token, unless `refresh_auth=False` is given.
+            The request is recorded in the metrics (see METRICS).
+
+            Parameter:
+                method [String]     : HTTP method (GET/POST)
+                endpoint [String]   : Complete URL of the request
+
+            Return:
+                [Response]
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        refresh_auth = kwargs.pop('refresh_auth', True)
+        headers = kwargs.get('headers')
+        reauthenticated = False
+        attempt = 0
+        started = time.monotonic()
+        while True:
+            sent = headers.get('Authorization') if headers else None
+            ticket = self.limiter.wait()
+            sent_at = time.monotonic()
+            try:
+                with REQUEST_SLOTS or contextlib.nullcontext():
+                    response = self.session.request(method, endpoint,
+                                                    **kwargs)
+            except (requests.exceptions.ConnectionError,
+                    requests.exceptions.Timeout):
+                if attempt >= self.retries:
+                    METRICS.record_request(
+                        method=method, endpoint=endpoint, status=0,
+                        latency=time.monotonic() - sent_at,
+                        elapsed=time.monotonic() - started, size=0,
+                        retries=attempt + int(reauthenticated))
+                    raise
+                self._wait_before_retry(attempt=attempt)
+                attempt += 1
+                continue
+            latency = time.monotonic() - sent_at
+            self.limiter.update(headers=response.headers, ticket=ticket)
+            if response.status_code == 401 and refresh_auth and sent and\
+                    not reauthenticated:
+                reauthenticated = True
+                if self.reauthenticate(headers=headers, sent=sent):
+                    continue
+            if response.status_code in RETRY_STATUS and\
+                    attempt < self.retries:
+                self._wait_before_retry(attempt=attempt, response=response)
+                attempt += 1
+                continue
+            METRICS.record_request(
+                method=method, endpoint=endpoint,
+                status=response.status_code, latency=latency,
+                elapsed=time.monotonic() - started,
+                size=len(response.content),
+                retries=attempt + int(reauthenticated))
+            return response
+
+    def get(self, endpoint, **kwargs):
+        return self.request('GET', endpoint, **kwargs)
+
+    def post(self, endpoint, **kwargs):
+        return self.request('POST', endpoint, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+def configure(**settings):
+    """
+        Adjust the settings (see CLIENT_SETTINGS) for clients created
+        after this call.
+    """
+    CLIENT_SETTINGS.update(
+        {key: value for key, value in settings.items() if value is not None})
+
+
+def share_request_slots(semaphore):
+    """
+        Limit the concurrent requests of this process together with other
+        processes, the semaphore is acquired for every attempt.
+
+        Parameter:
+            semaphore [Semaphore] : multiprocessing semaphore or None
+    """
+    global REQUEST_SLOTS
+    REQUEST_SLOTS = semaphore
+
+
+def get_client(url):
+    """
+        Get the shared client of a shop, create it on the first usage.
+
+        Parameter:
+            url [String] : Base URL of the shop provided by the config
+
+        Return:
+            [PlentyClient]
+    """
+    with CLIENTS_LOCK:
+        if url not in CLIENTS:
+            CLIENTS[url] = PlentyClient(url=url, **CLIENT_SETTINGS)
+        return CLIENTS[url]
@@ -0,0 +1,146 @@
+"""
+    Author: Sebastian Fricke (Panasiam)
+    Date: 2020-07-30
+    License: GPLv3
+
+    Support for incremental exports: remember when the last export took
+    place and merge the variations changed since then into a snapshot of
+    the previous export.
+"""
+import contextlib
+import os
+import hashlib
+import simplejson
+
+import plenty_attribute_export.packages.plentyapi as pa
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+
+def snapshot_path(directory, url):
+    """
+        Location of the snapshot of the last complete export for a shop.
+
+        Parameter:
+            directory [String]  : Folder of the configuration file
+            url [String]        : Base URL of the shop provided by the config
+
+        Return:
+            [String]
+    """
+    shop = hashlib.md5(url.encode('utf-8')).hexdigest()[:8]
+    return os.path.join(directory, str(f'.plenty_export_snapshot_{shop}.csv'))
+
+
+def load_state(path, url):
+    """
+        Get the high-water mark of the last successful export for a shop.
+
+        Parameter:
+            path [String]   : Location of the state file
+            url [String]    : Base URL of the shop provided by the config
+
+        Return:
+            [Dict] : {updated_since, snapshot} or an empty dictionary
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path, mode='r') as state_file:
+        try:
+            state = simplejson.load(state_file)
+        except simplejson.errors.JSONDecodeError:
+            print(f"WARNING: Invalid state file {path}, starting over")
+            return {}
+    return state.get(url, {})
+
+
+@contextlib.contextmanager
+def locked(path):
+    """
+        Hold an exclusive lock of the file `<path>.lock`, so that the
+        processes of a multi-profile export update a file one at a time.
+    """
+    with open(path + '.lock', mode='a') as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        else:
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+            else:
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def save_state(path, url, updated_since, snapshot):
+    """
+        Save the high-water mark for a shop, the state of other shops
+        within the same file stays untouched. The file is locked while it
+        is read and replaced, the readers never see a partial file.
+
+        Parameter:
+            path [String]       : Location of the state file
+            url [String]        : Base URL of the shop provided by the config
+            updated_since [Int] : UNIX timestamp of the start of the export
+            snapshot [String]   : Location of the export snapshot
+    """
+    with locked(path):
+        state = {}
+        if os.path.exists(path):
+            with open(path, mode='r') as state_file:
+                try:
+                    state = simplejson.load(state_file)
+                except simplejson.errors.JSONDecodeError:
+                    state = {}
+        state[url] = {'updated_since': updated_since, 'snapshot': snapshot}
+        temporary = str(f'{path}.{os.getpid()}.tmp')
+        with open(temporary, mode='w') as state_file:
+            simplejson.dump(state, state_file, indent=4)
+        os.replace(temporary, path)
+
+
+def read_snapshot(path):
+    """
+        Return:
+            [DataFrame] : Previous export as strings, None if missing
+    """
+    if not os.path.exists(path):
+        return None
+    import pandas
+    return pandas.read_csv(path, sep=';', dtype=str, keep_default_na=False)
+
+
+def write_snapshot(frame, path):
+    pa.frame_to_text(frame).to_csv(path, sep=';', index=False)
+
+
+def merge_frames(previous, changed, existing_ids=None):
+    """
+        Replace the rows of changed variations within the previous export,
+        add new variations and drop the ones, that no longer exist.
+
+        Parameter:
+            previous [DataFrame]: Previous export (see read_snapshot)
+            changed [DataFrame] : Variations changed since the last export
+            existing_ids [Set]  : IDs of every existing variation, without
+                                  them deleted variations are kept
+
+        Return:
+            [DataFrame] : With the column types of the changed frame
+    """
+    import pandas
+    changed = pa.frame_to_text(changed)
+    unchanged = previous[~previous['variation-id'].isin(
+        changed['variation-id'])]
+    merged = pandas.concat([unchanged, changed], ignore_index=True)
+    if existing_ids is not None:
+        existing = {str(variation_id) for variation_id in existing_ids}
+        merged = merged[merged['variation-id'].isin(existing)]
+    order = pandas.to_numeric(merged['variation-id']).argsort(kind='stable')
+    return pa.restore_types(merged.iloc[order].reset_index(drop=True))
@@ -1,21 +1,148 @@
+import os
 import keyring
+import keyring.errors
 import getpass
+import simplejson
+
+# Environment variables, which provide the credentials for headless runs
+USERNAME_VARIABLE = 'PLENTY_USERNAME'
+PASSWORD_VARIABLE = 'PLENTY_PASSWORD'
+CREDENTIALS_FILE_VARIABLE = 'PLENTY_CREDENTIALS_FILE'
+
+SETTINGS = {
+    'credentials': {},
+    'interactive': True
+}
+
+
+def configure(credentials=None, interactive=True):
+    """
+        Use credentials from outside of the system keyring (see
+        load_credentials) and forbid prompts for non-interactive runs.
+    """
+    SETTINGS['credentials'] = credentials or {}
+    SETTINGS['interactive'] = interactive
+
+
+def load_credentials(path=None):
+    """
+        Read the credentials of a headless run from a JSON file
+        ({"username": ..., "password": ...}), the path is either given
+        or taken from PLENTY_CREDENTIALS_FILE. The variables PLENTY_USERNAME
+        and PLENTY_PASSWORD take precedence over the file.
+
+        Parameter:
+            path [String] : Optional location of the credentials file
+
+        Return:
+            [Dict] : {username, password} or an empty dictionary
+    """
+    credentials = {}
+    path = path or os.environ.get(CREDENTIALS_FILE_VARIABLE)
+    if path:
+        try:
+            with open(path, mode='r') as credentials_file:
+                content = simplejson.load(credentials_file)
+            credentials = {'username': content['username'],
+                           'password': content['password']}
+        except (OSError, KeyError, TypeError,
+                simplejson.errors.JSONDecodeError) as err:
+            print(f"ERROR: Invalid credentials file {path} => {err}")
+    if os.environ.get(USERNAME_VARIABLE) and\
+            os.environ.get(PASSWORD_VARIABLE):
+        credentials = {'username': os.environ[USERNAME_VARIABLE],
+                       'password': os.environ[PASSWORD_VARIABLE]}
+    return credentials
+
 
 class CredentialManager():
     def __init__(self):
-        pass
+        self.credentials = SETTINGS['credentials']
+        self.interactive = SETTINGS['interactive']
+
     def set_credentials(self):
+        if self.credentials or not self.interactive:
+            print("ERROR: Missing or invalid credentials, provide them with "
+                  f"{USERNAME_VARIABLE}/{PASSWORD_VARIABLE} or a "
+                  "credentials file.")
+            return False
         username = input('Username: ')
         keyring.set_password('plenty-identity', 'user', username)
         keyring.set_password('plenty-identity', 'password', getpass.getpass())
+        return True
 
     def get_credentials(self):
-        user = keyring.get_password('plenty-identity', 'user')
-        password = keyring.get_password('plenty-identity', 'password')
+        if self.credentials:
+            return dict(self.credentials)
+        try:
+            user = keyring.get_password('plenty-identity', 'user')
+            password = keyring.get_password('plenty-identity', 'password')
+        except keyring.errors.KeyringError:
+            return {}
         if not user or not password:
             return {}
         return {'username':user, 'password':password}
 
     def delete_credentials(self):
+        if self.credentials or not self.interactive:
+            return
         keyring.delete_password('plenty-identity', 'user')
         keyring.delete_password('plenty-identity', 'password')
+
+    def token_key(self, url):
+        """
+            Name of the saved token of the shop and the user of the
+            credentials, so that different API users never share a token.
+
+            Return:
+                [String] : Empty without credentials
+        """
+        username = self.get_credentials().get('username')
+        if not username:
+            return ''
+        return str(f'token-{url}-{username}')
+
+    # Containers usually lack a keyring backend, a new token is then
+    # requested on every run
+    def set_token(self, url, token):
+        key = self.token_key(url=url)
+        if not key:
+            return
+        try:
+            keyring.set_password('plenty-identity', key,
+                                 simplejson.dumps(token))
+        except keyring.errors.KeyringError:
+            pass
+
+    def get_token(self, url):
+        """
+            Return:
+                [Dict] : Saved token, empty if it is missing or incomplete
+        """
+        key = self.token_key(url=url)
+        if not key:
+            return {}
+        try:
+            token = keyring.get_password('plenty-identity', key)
+        except keyring.errors.KeyringError:
+            return {}
+        if not token:
+            return {}
+        try:
+            token = simplejson.loads(token)
+        except simplejson.errors.JSONDecodeError:
+            return {}
+        if not isinstance(token, dict) or\
+                not all(token.get(field) for field in
+                        ('token_type', 'access_token', 'expires_at')):
+            return {}
+        return token
+
+    def delete_token(self, url):
+        key = self.token_key(url=url)
+        if not key:
+            return
+        try:
+            keyring.delete_password('plenty-identity', key)
+        except keyring.errors.KeyringError:
+            pass
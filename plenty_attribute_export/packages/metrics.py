@@ -0,0 +1,185 @@
+"""
+    Author: Sebastian Fricke (Panasiam)
+    Date: 2020-07-30
+    License: GPLv3
+
+    Record every request to the PlentyMarkets API (endpoint, latency,
+    status, size and retries) together with the phase of the export, in
+    which it was sent, to find out where the time of a run is spent.
+"""
+import math
+import re
+import threading
+import time
+import urllib.parse
+import simplejson
+
+# Numeric path segments are replaced to group the requests by endpoint
+ID_SEGMENT = re.compile(r'/\d+(?=/|$)')
+
+
+def endpoint_template(endpoint):
+    """
+        Parameter:
+            endpoint [String] : Complete URL of a request
+
+        Return:
+            [String] : Path of the URL with placeholders for the IDs,
+                       e.g. /rest/items/{id}/variations
+    """
+    path = urllib.parse.urlsplit(endpoint).path
+    return ID_SEGMENT.sub('/{id}', path)
+
+
+def percentile(values, share):
+    """ Nearest-rank percentile of a sorted list. """
+    if not values:
+        return 0.0
+    index = max(math.ceil(share * len(values)) - 1, 0)
+    return values[min(index, len(values) - 1)]
+
+
+class Metrics():
+    """
+        Collects the request timings of all threads and asyncio tasks
+        and the wall time of each phase of the export. Requests are only
+        recorded while `enabled` is set.
+    """
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.requests = []
+        self.cache = {}
+        self.phases = {}
+        self.current_phase = 'setup'
+        self.started = time.monotonic()
+        self.phase_started = self.started
+
+    def start_phase(self, name):
+        """
+            End the current phase of the export and attribute the following
+            requests to the new phase.
+
+            Parameter:
+                name [String] : Name of the phase (variations, translations..)
+        """
+        now = time.monotonic()
+        with self.lock:
+            self.phases[self.current_phase] = self.phases.get(
+                self.current_phase, 0.0) + now - self.phase_started
+            self.current_phase = name
+            self.phase_started = now
+
+    def _phase_times(self):
+        phases = dict(self.phases)
+        phases[self.current_phase] = phases.get(self.current_phase, 0.0) +\
+            time.monotonic() - self.phase_started
+        return phases
+
+    def record_request(self, method, endpoint, status, latency, elapsed,
+                       size, retries):
+        """
+            Parameter:
+                method [String]     : HTTP method
+                endpoint [String]   : Complete URL of the request
+                status [Int]        : Status code of the last attempt, 0 for
+                                      a connection error
+                latency [Float]     : Seconds until the last response
+                elapsed [Float]     : Seconds including retries and waiting
+                                      for the call limit
+                size [Int]          : Bytes of the response body
+                retries [Int]       : Additional attempts of the request
+        """
+        if not self.enabled:
+            return
+        record = {'phase': self.current_phase, 'method': method,
+                  'endpoint': endpoint_template(endpoint), 'status': status,
+                  'latency': latency, 'elapsed': elapsed, 'bytes': size,
+                  'retries': retries,
+                  'offset': time.monotonic() - self.started}
+        with self.lock:
+            self.requests.append(record)
+
+    def record_cache(self, name, hits, misses):
+        """ Count the hits and misses of a persistent cache lookup. """
+        with self.lock:
+            entry = self.cache.setdefault(name, {'hits': 0, 'misses': 0})
+            entry['hits'] += hits
+            entry['misses'] += misses
+
+    def totals(self):
+        """
+            Return:
+                [Dict] : Wall time, phase times, amount of requests, retries
+                         and failed requests of the run
+        """
+        with self.lock:
+            return {'wall_time': time.monotonic() - self.started,
+                    'phases': self._phase_times(),
+                    'requests': len(self.requests),
+                    'retries': sum(record['retries']
+                                   for record in self.requests),
+                    'errors': sum(1 for record in self.requests
+                                  if not 0 < record['status'] < 400)}
+
+    def summary(self):
+        """
+            Return:
+                [String] : Report per phase and per endpoint
+        """
+        with self.lock:
+            requests = list(self.requests)
+            phases = self._phase_times()
+            cache = {name: dict(entry) for name, entry in self.cache.items()}
+        lines = ['Profile:', str(f"  total wall time "
+                                 f"{time.monotonic() - self.started:.2f}s")]
+        lines.append(str(f"  {'phase':<16}{'wall':>9}{'requests':>10}"))
+        for name, duration in phases.items():
+            count = sum(1 for record in requests if record['phase'] == name)
+            lines.append(str(f"  {name:<16}{duration:>8.2f}s{count:>10}"))
+
+        groups = {}
+        for record in requests:
+            groups.setdefault((record['method'], record['endpoint']),
+                              []).append(record)
+        lines.append(str(
+            f"  {'endpoint':<58}{'count':>7}{'p50':>8}{'p95':>8}{'p99':>8}"
+            f"{'total':>9}{'KiB':>9}{'retries':>8}{'errors':>7}"))
+        for (method, endpoint), records in sorted(
+                groups.items(), key=lambda group: -sum(
+                    record['elapsed'] for record in group[1])):
+            latencies = sorted(record['latency'] for record in records)
+            elapsed = sum(record['elapsed'] for record in records)
+            size = sum(record['bytes'] for record in records) / 1024
+            retries = sum(record['retries'] for record in records)
+            errors = sum(1 for record in records
+                         if not 0 < record['status'] < 400)
+            lines.append(str(
+                f"  {method + ' ' + endpoint:<58}{len(records):>7}"
+                f"{percentile(latencies, 0.5) * 1000:>6.0f}ms"
+                f"{percentile(latencies, 0.95) * 1000:>6.0f}ms"
+                f"{percentile(latencies, 0.99) * 1000:>6.0f}ms"
+                f"{elapsed:>8.2f}s{size:>9.1f}{retries:>8}{errors:>7}"))
+        for name, entry in cache.items():
+            lines.append(str(f"  cache {name}: {entry['hits']} hits, "
+                             f"{entry['misses']} misses"))
+        return '\n'.join(lines)
+
+    def dump(self, path):
+        """
+            Write the raw timings to a JSON file, to compare runs.
+
+            Parameter:
+                path [String] : Location of the JSON file
+        """
+        with self.lock:
+            data = {'created': time.time(),
+                    'wall_time': time.monotonic() - self.started,
+                    'phases': self._phase_times(),
+                    'cache': self.cache,
+                    'requests': list(self.requests)}
+            with open(path, mode='w') as profile_file:
+                simplejson.dump(data, profile_file, indent=2)
+
+
+METRICS = Metrics()
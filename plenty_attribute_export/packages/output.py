@@ -0,0 +1,226 @@
+"""
+    Author: Sebastian Fricke (Panasiam)
+    Date: 2020-07-30
+    License: GPLv3
+
+    Write the export in different file formats. Next to the semicolon
+    separated CSV file, the export can be saved as JSON lines or in the
+    columnar Parquet/Feather formats, which keep the column types and can
+    be loaded with a fast memory-mapped read (requires the optional
+    pyarrow package).
+    On the console, the export is either rendered as a table or written
+    row by row as TSV, NDJSON or fixed-width columns.
+"""
+import bz2
+import gzip
+import lzma
+import os
+import sys
+
+from plenty_attribute_export.packages.plentyapi import frame_to_text
+
+FORMATS = {
+    'csv': '.csv',
+    'jsonl': '.jsonl',
+    'parquet': '.parquet',
+    'feather': '.feather'
+}
+# Supported compression codecs of each format
+COMPRESSIONS = {
+    'csv': ('gzip', 'bz2', 'xz'),
+    'jsonl': ('gzip', 'bz2', 'xz'),
+    'parquet': ('snappy', 'gzip', 'brotli', 'zstd'),
+    'feather': ('lz4', 'zstd')
+}
+# Formats, which can be extended page by page (see StreamWriter)
+STREAM_FORMATS = ('csv', 'jsonl')
+# File endings of compressed text files
+SUFFIXES = {'gzip': '.gz', 'bz2': '.bz2', 'xz': '.xz'}
+OPENERS = {None: open, 'gzip': gzip.open, 'bz2': bz2.open, 'xz': lzma.open}
+# Console formats, only the table requires the complete export at once
+STDOUT_FORMATS = ('auto', 'table', 'tsv', 'ndjson', 'fixed')
+# Larger exports are written with a streaming format in the auto mode
+TABLE_MAX_ROWS = 500
+# Rows converted to text at once, when a complete export is written
+STDOUT_CHUNK_ROWS = 1000
+# Rows of the first chunk used to determine the fixed column widths
+FIXED_SAMPLE_ROWS = 200
+FIXED_MAX_WIDTH = 40
+
+
+def file_extension(fmt, compression=None):
+    """
+        Parameter:
+            fmt [String]            : Output format (see FORMATS)
+            compression [String]    : Optional compression codec
+
+        Return:
+            [String] : File ending of the export, e.g. '.csv.gz'
+    """
+    extension = FORMATS[fmt]
+    if fmt in STREAM_FORMATS and compression:
+        extension += SUFFIXES[compression]
+    return extension
+
+
+def jsonl_text(frame):
+    """ Serialize the rows of the frame as one JSON object per line. """
+    if frame.empty:
+        return ''
+    text = frame.to_json(orient='records', lines=True, force_ascii=False)
+    return text.rstrip('\n') + '\n'
+
+
+def write_frame(frame, path, fmt='csv', compression=None):
+    """
+        Save the complete export in the chosen format.
+
+        Parameter:
+            frame [DataFrame]       : Export data
+            path [String]           : Location of the output file
+            fmt [String]            : Output format (see FORMATS)
+            compression [String]    : Optional compression codec
+                                      (see COMPRESSIONS)
+    """
+    if fmt == 'csv':
+        frame.to_csv(path, sep=';', index=False, compression=compression)
+    elif fmt == 'jsonl':
+        with OPENERS[compression](path, mode='wt',
+                                  encoding='utf-8') as output_file:
+            output_file.write(jsonl_text(frame=frame))
+    elif fmt == 'parquet':
+        frame.to_parquet(path, index=False,
+                         compression=compression or 'snappy')
+    elif fmt == 'feather':
+        frame.reset_index(drop=True).to_feather(
+            path, compression=compression or 'uncompressed')
+
+
+def stdout_format(fmt, rows=None, tty=False):
+    """
+        Resolve the auto mode of the console output.
+
+        Parameter:
+            fmt [String]    : Chosen format (see STDOUT_FORMATS)
+            rows [Int]      : Amount of rows, None if the rows are written
+                              before the export is complete
+            tty [Bool]      : The console output is a terminal
+
+        Return:
+            [String] : table/tsv/ndjson/fixed
+    """
+    if fmt != 'auto':
+        return fmt
+    if rows is not None and rows <= TABLE_MAX_ROWS:
+        return 'table'
+    return 'fixed' if tty else 'tsv'
+
+
+def text_rows(frame):
+    """
+        Return:
+            [Iterator] : Tuple of strings for each row, without tabs and
+                         line breaks within the values
+    """
+    text = frame_to_text(frame).replace(r'[\t\r\n]', ' ', regex=True)
+    return text.itertuples(index=False, name=None)
+
+
+class StdoutWriter():
+    """
+        Write the export chunk by chunk to the console (or a pipe), every
+        chunk is written as soon as it is ready. The widths of the
+        fixed-width columns are taken from a sample of the first chunk,
+        longer values are shortened. The export stops quietly, when the
+        reading end of a pipe is closed (e.g. `| head`).
+
+        Parameter:
+            file [File]     : Output stream
+            fmt [String]    : tsv/ndjson/fixed
+    """
+    def __init__(self, file, fmt='tsv'):
+        self.file = file
+        self.fmt = fmt
+        self.widths = None
+        self.header = False
+        self.written = 0
+
+    def _fixed_line(self, values):
+        cells = []
+        for value, width in zip(values, self.widths):
+            if len(value) > width:
+                value = value[:width - 1] + '~'
+            cells.append(value.ljust(width))
+        return ' '.join(cells).rstrip() + '\n'
+
+    def write(self, chunk):
+        try:
+            self._write(chunk=chunk)
+        except BrokenPipeError:
+            # further writes (and the flush at exit) would fail again
+            os.dup2(os.open(os.devnull, os.O_WRONLY), self.file.fileno())
+            sys.exit(1)
+        self.written += len(chunk.index)
+
+    def _write(self, chunk):
+        if self.fmt == 'ndjson':
+            self.file.write(jsonl_text(frame=chunk))
+        else:
+            rows = text_rows(frame=chunk)
+            if self.fmt == 'tsv':
+                if not self.header:
+                    self.file.write('\t'.join(chunk.columns) + '\n')
+                    self.header = True
+                self.file.writelines('\t'.join(row) + '\n' for row in rows)
+            else:
+                if not self.header:
+                    sample = list(text_rows(frame=chunk.head(
+                        FIXED_SAMPLE_ROWS)))
+                    self.widths = [
+                        min(max([len(column)] +
+                                [len(row[index]) for row in sample]),
+                            FIXED_MAX_WIDTH)
+                        for index, column in enumerate(chunk.columns)]
+                    self.file.write(self._fixed_line(chunk.columns))
+                    self.file.write(self._fixed_line(
+                        ['-' * width for width in self.widths]))
+                    self.header = True
+                self.file.writelines(self._fixed_line(row) for row in rows)
+        self.file.flush()
+
+    def write_frame(self, frame):
+        """ Write a complete export in chunks of STDOUT_CHUNK_ROWS rows. """
+        for start in range(0, max(len(frame.index), 1), STDOUT_CHUNK_ROWS):
+            self.write(chunk=frame.iloc[start:start + STDOUT_CHUNK_ROWS])
+
+    def close(self):
+        self.file.flush()
+
+
+class StreamWriter():
+    """
+        Append the export chunk by chunk to a CSV or JSON lines file,
+        the header of the CSV file is only written for the first chunk.
+
+        Parameter:
+            path [String]           : Location of the output file
+            fmt [String]            : Output format (see STREAM_FORMATS)
+            compression [String]    : Optional compression codec
+    """
+    def __init__(self, path, fmt='csv', compression=None):
+        self.fmt = fmt
+        self.written = 0
+        self.file = OPENERS[compression](path, mode='wt', encoding='utf-8',
+                                         newline='')
+
+    def write(self, chunk):
+        if self.fmt == 'csv':
+            chunk.to_csv(self.file, sep=';', index=False,
+                         header=not self.written)
+        else:
+            self.file.write(jsonl_text(frame=chunk))
+        self.file.flush()
+        self.written += len(chunk.index)
+
+    def close(self):
+        self.file.close()
@@ -6,20 +6,51 @@
     Various calls to the PlentyMarkets API for ITEM data.
 """
 import sys
-import requests
-import pandas
+import time
+import collections
+import concurrent.futures
+import functools
+import itertools
 import simplejson
 
+from plenty_attribute_export.packages.client import get_client
 from plenty_attribute_export.packages.keyring import CredentialManager
-from plenty_attribute_export.packages.progress import Progressbar
 
-PROGRESS = Progressbar(size=80, prefix='Get Data..')
+PROGRESS = None
+DEFAULT_ITEMS_PER_PAGE = 100
+DEFAULT_WORKERS = 4
+# Amount of variation IDs within a single filtered variation request
+VARIATION_ID_BATCH_SIZE = 100
+# Seconds before the expiry, from which a saved token is no longer reused
+TOKEN_EXPIRY_MARGIN = 300
+
+
+def get_progress():
+    """
+        Progress indicator of the variation download, created on the first
+        usage, so that short runs do not have to load it.
+
+        Return:
+            [Progressbar]
+    """
+    global PROGRESS
+    if PROGRESS is None:
+        from plenty_attribute_export.packages.progress import Progressbar
+        PROGRESS = Progressbar(size=40, prefix='Get Data..',
+                               unit='variations')
+    return PROGRESS
+
 
 def get_request_plenty_api(route, url, headers):
     """ Simple wrapper to create a request route, get the response and
-        parse it to JSON, if it is valid. """
+        parse it to JSON, if it is valid. Error responses (status codes
+        outside of 2xx), which remain after the retries, return None. """
     endpoint = url + route
-    raw_response = requests.get(endpoint, headers=headers)
+    raw_response = get_client(url).get(endpoint, headers=headers)
+    if not 200 <= raw_response.status_code < 300:
+        print(f'ERROR: Request failed with status '
+              f'{raw_response.status_code}: {route}')
+        return None
     try:
         response = raw_response.json()
     except simplejson.errors.JSONDecodeError:
@@ -27,38 +58,175 @@ def get_request_plenty_api(route, url, headers):
         response = None
     return response
 
-def get_attribute(data, dest, attribute_id):
+
+def get_selected_attributes(attributes, config):
+    """
+        Reduce the attributes of the shop to the ones chosen within the
+        configuration, in the order of the attribute request.
+
+        Parameter:
+            attributes [List]   : Response to Attribute request ({name, id})
+            config [Dict]       : Config mapping of values used in
+                                  the plentymarkets client
+
+        Return:
+            [List]
+    """
+    selected_ids = set(config['PLENTY']['attribute_ids'].split(','))
+    return [attribute for attribute in attributes
+            if str(attribute['id']) in selected_ids]
+
+
+class RowExtractor():
+    """
+        Move through the entries of a variation response and collect the
+        values required by the data-set into one buffer per column.
+
+        The configuration is evaluated once on creation, each entry is
+        indexed by attribute ID in a single pass over its attribute values.
+
+        Parameter:
+            attributes [List]   : Response to Attribute request ({name, id})
+            config [Dict]       : Config mapping of values used in
+                                  the plentymarkets client
+    """
+    def __init__(self, attributes, config):
+        self.config = config
+        self.columns = build_columns(attr=attributes, config=config)
+        self.attribute_ids = [
+            int(attribute['id']) for attribute in
+            get_selected_attributes(attributes=attributes, config=config)]
+
+    def new_buffers(self):
+        """ Return: [List] : One empty list per column """
+        return [[] for _ in self.columns]
+
+    def extract(self, entries, buffers, offset=0):
+        """
+            Append the values of every non-main variation to the buffers.
+            The parent SKU is taken from the variationSkus relation, when
+            it is missing the value is filled by another GET request.
+
+            Parameter:
+                entries [List]  : Variations of a response
+                buffers [List]  : Column buffers (see new_buffers)
+                offset [Int]    : Entries processed on previous pages
+        """
+        (ids, numbers, parent_skus), item_ids = buffers[:3], buffers[-1]
+        attribute_buffers = [
+            (attribute_id, buffers[3 + index * 3], buffers[4 + index * 3],
+             buffers[5 + index * 3])
+            for index, attribute_id in enumerate(self.attribute_ids)]
+        for entry in entries:
+            if entry['isMain']:
+                continue
+            values = {}
+            for attribute in entry.get('variationAttributeValues', ()):
+                values.setdefault(attribute['attributeId'],
+                                  attribute['attributeValue'])
+            ids.append(entry['id'])
+            numbers.append(entry['number'])
+            if 'variationSkus' in entry:
+                parent_skus.append(get_market_parent_sku(
+                    response=entry['variationSkus'], config=self.config))
+            else:
+                parent_skus.append('')
+            for attribute_id, names, value_ids, langs in attribute_buffers:
+                value = values.get(attribute_id)
+                if value:
+                    names.append(value['backendName'])
+                    value_ids.append(value['id'])
+                else:
+                    names.append('')
+                    value_ids.append('')
+                langs.append('')
+            item_ids.append(entry['itemId'])
+        if entries:
+            get_progress().update(done=offset + len(entries))
+
+    def build_frame(self, buffers):
+        """
+            Create the pandas DataFrame column by column from the buffers
+            (see column_array).
+
+            Return:
+                [DataFrame]
+        """
+        import pandas
+        return pandas.DataFrame(
+            {column: column_array(column=column, values=values)
+             for column, values in zip(self.columns, buffers)},
+            columns=self.columns)
+
+
+def column_array(column, values):
+    """
+        Convert the values of an export column to the type of the column.
+        ID columns use a nullable integer type (missing attribute values
+        are NA), the names, translations and parent SKUs hold only a few
+        distinct values and are stored as categories.
+
+        Parameter:
+            column [String] : Name of the column
+            values [List]   : Values of the column, empty for missing values
+
+        Return:
+            [ExtensionArray]
     """
-        Insert the attribute values for every required existing attribute
-        append empty values for if it doesn't exist.
+    import pandas
+    if column in ('variation-id', 'item-id') or column.endswith('_id'):
+        return pandas.array(
+            [None if value == '' else int(value) for value in values],
+            dtype='Int64')
+    if column == 'variation-number':
+        return pandas.array(values, dtype=object)
+    return pandas.Categorical(values)
+
+
+def restore_types(frame):
     """
-    if not 'variationAttributeValues' in data.keys():
-        dest += ['', '', '']
-        return
-    for attribute in data['variationAttributeValues']:
-        if attribute['attributeId'] == attribute_id:
-            dest += [attribute['attributeValue']['backendName'],
-                     attribute['attributeValue']['id'], '']
-            return
-    dest += ['', '', '']
+        Give a frame of strings (e.g. a read snapshot) the column types
+        of an export built by the RowExtractor.
 
-def for_each_entry_get_basic_data(entries, dest, config):
+        Return:
+            [DataFrame]
     """
-        Move through the entries of the response (entries) and get the values,
-        which are required by the data-set. Add these values to a list (dest)
-        used for the creation of the pandas DataFrame.
+    import pandas
+    return pandas.DataFrame(
+        {column: column_array(column=column, values=frame[column].tolist())
+         for column in frame.columns}, columns=frame.columns)
+
+
+def frame_to_text(frame):
+    """ Convert every value to its string representation, empty for NA. """
+    return frame.astype(object).where(frame.notna(), '').astype(str)
+
+
+def format_pages(pages):
+    """ Return: [String] : Pages as `<route index>/<page number>` list """
+    return ','.join(str(f'{index}/{page}') for index, page in sorted(pages))
+
+
+def merge_buffers(pages):
     """
-    for index, entry in enumerate(entries):
-        PROGRESS.emit(index=index)
-        if entry['isMain']:
+        Combine the column buffers of multiple pages in page order.
+
+        Parameter:
+            pages [Dict] : Mapping of (route index, page number) to column
+                           buffers
+
+        Return:
+            [List] : Column buffers
+    """
+    merged = None
+    for page in sorted(pages.keys()):
+        if merged is None:
+            merged = [list(column) for column in pages[page]]
             continue
-        # Add 2 empty values for the SKUs by another GET request.
-        variation = [entry['id'], entry['number'], '']
-        for attr_id in config['PLENTY']['attribute_ids'].split(','):
-            get_attribute(data=entry, dest=variation,
-                          attribute_id=int(attr_id))
-        variation += [entry['itemId']]
-        dest.append(variation)
+        for column, values in zip(merged, pages[page]):
+            column.extend(values)
+    return merged
+
 
 def get_market_parent_sku(response, config):
     """
@@ -81,6 +249,7 @@ def get_market_parent_sku(response, config):
                 return entry['parentSku']
     return 'Not found'
 
+
 def build_columns(attr, config):
     """
         Create the columns for the pandas DataFrame, depending on the
@@ -94,56 +263,89 @@ def build_columns(attr, config):
     """
     columns = ['variation-id', 'variation-number',
                'parent-variation']
-    for entry in attr:
-        if str(entry['id']) in config['PLENTY']['attribute_ids'].split(','):
-            columns.append(str(f"{entry['name']}_name"))
-            columns.append(str(f"{entry['name']}_id"))
-            columns.append(str(f"{entry['name']}_lang"))
+    for entry in get_selected_attributes(attributes=attr, config=config):
+        columns.append(str(f"{entry['name']}_name"))
+        columns.append(str(f"{entry['name']}_id"))
+        columns.append(str(f"{entry['name']}_lang"))
     columns.append('item-id')
     return columns
 
-def get_route(scope):
+
+def get_routes(scope):
     """
-        Build the route for the different variation GET requests.
-        Depending on the chosen option, apply the specified
-        item_id or variation_id values.
+        Build the routes for the different variation GET requests.
+        Depending on the chosen option, request every variation, the
+        variations of each specified item or the specified variations,
+        which are filtered by their IDs in batches of
+        VARIATION_ID_BATCH_SIZE.
+        An optional `updated_since` argument (UNIX timestamp) restricts
+        the result to variations changed after that point in time.
 
         Parameter:
             scope [Dict] : User defined parameter from the CLI
 
         Return:
-            [String] : Part of the HTTP request after the base URL.
+            [List] : Parts of the HTTP requests after the base URL.
     """
+    relations = "with=variationAttributeValues,variationSkus"
     if scope['name'] == 'all':
-        route = '/rest/items/variations'
+        routes = [str(f"/rest/items/variations?{relations}")]
     elif scope['name'] == 'item':
-        route = str(f"/rest/items/{scope['args']['item']}/variations")
+        routes = [str(f"/rest/items/{item}/variations?{relations}")
+                  for item in scope['args']['item']]
     elif scope['name'] == 'variation':
-        route = str("/rest/items/{0}/variations/{1}".format(
-            scope['args']['item'], scope['args']['variation']))
-    return route + "?with=variationAttributeValues"
+        variations = scope['args']['variation']
+        routes = [str("/rest/items/variations?id={0}&{1}".format(
+            ','.join(str(variation) for variation in
+                     variations[start:start + VARIATION_ID_BATCH_SIZE]),
+            relations))
+                  for start in range(0, len(variations),
+                                     VARIATION_ID_BATCH_SIZE)]
+    if scope['args'].get('updated_since'):
+        routes = [route +
+                  str(f"&updatedBetween={scope['args']['updated_since']}")
+                  for route in routes]
+    return routes
+
 
 def build_login_token(response_json):
     token_type = response_json['token_type']
     access_token = response_json['access_token']
     return token_type + ' ' + access_token
 
-def plenty_api_login(url):
+
+def save_login_token(keyring, url, response_json):
     """
-        Get the bearer token with the credentials saved in the data file.
+        Keep the token of a login response in the system keyring, for the
+        following runs of the application.
+    """
+    keyring.set_token(url=url, token={
+        'token_type': response_json['token_type'],
+        'access_token': response_json['access_token'],
+        'refresh_token': response_json.get('refresh_token', ''),
+        'expires_at': time.time() + int(response_json.get('expires_in', 0))
+    })
 
-        Parameter:
-            url [String] : Base URL of the shop provided by the config
+
+def request_login(url, keyring):
     """
+        Get a new bearer token with the credentials saved in the keyring.
+
+        Parameter:
+            url [String]                : Base URL of the shop
+            keyring [CredentialManager]
 
+        Return:
+            [String] : Authorization value / empty on failure
+    """
     token = ''
-    keyring = CredentialManager()
     creds = keyring.get_credentials()
     if not creds:
-        keyring.set_credentials()
+        if not keyring.set_credentials():
+            return token
         creds = keyring.get_credentials()
     endpoint = url + '/rest/login'
-    response = requests.post(endpoint, params=creds)
+    response = get_client(url).post(endpoint, params=creds)
     if response.status_code == 403:
         print("ERROR: Login to API failed, your account is locked")
         print("unlock @ Setup->settings->accounts->go to user->unlock login")
@@ -154,12 +356,13 @@ def plenty_api_login(url):
             if response.json()['error'] == 'invalid_credentials':
                 print("Wrong credentials: Please enter valid credentials.")
                 keyring.delete_credentials()
-                keyring.set_credentials()
+                if not keyring.set_credentials():
+                    return ''
                 creds = keyring.get_credentials()
-                response = requests.post(endpoint, params=creds)
+                response = get_client(url).post(endpoint, params=creds)
                 token = build_login_token(response_json=response.json())
             else:
-                print(f"ERROR: Login to API failed with: {err}\nstatus: {respnse}")
+                print(f"ERROR: Login to API failed with: {err}\nstatus: {response}")
                 sys.exit(1)
         except KeyError as err:
             print(f"ERROR: Login to API failed with: {err}\nstatus: {response}")
@@ -168,11 +371,171 @@ def plenty_api_login(url):
             except Exception as err:
                 print(f"Could not open data: {err}")
 
+    if token:
+        save_login_token(keyring=keyring, url=url,
+                         response_json=response.json())
+    return token
+
+
+def plenty_api_refresh_login(url, headers):
+    """
+        Renew the authorization within the headers (in place), with the
+        saved refresh token if possible, otherwise with the credentials.
+
+        Parameter:
+            url [String]    : Base URL of the shop provided by the config
+            headers [Dict]  : HTTP header containing the expired token
+
+        Return:
+            [Bool] : True on success
+    """
+    keyring = CredentialManager()
+    cached = keyring.get_token(url=url)
+    token = ''
+    if cached.get('refresh_token'):
+        response = get_client(url).post(
+            url + '/rest/login/refresh',
+            params={'refresh_token': cached['refresh_token']},
+            headers={'Authorization': build_login_token(response_json=cached)},
+            refresh_auth=False)
+        try:
+            token = build_login_token(response_json=response.json())
+            save_login_token(keyring=keyring, url=url,
+                             response_json=response.json())
+        except (ValueError, KeyError):
+            token = ''
+    if not token:
+        token = request_login(url=url, keyring=keyring)
     if not token:
+        # neither renewable nor replaceable, the next run starts with a login
+        if cached:
+            keyring.delete_token(url=url)
+        return False
+    headers['Authorization'] = token
+    return True
+
+
+def plenty_api_login(url):
+    """
+        Get the bearer token, reuse the token of a previous run as long as
+        it is valid. The client of the shop renews the token, whenever the
+        API rejects it during the run.
+
+        Parameter:
+            url [String] : Base URL of the shop provided by the config
+    """
+    get_client(url).authenticator = functools.partial(
+        plenty_api_refresh_login, url=url)
+    cached = CredentialManager().get_token(url=url)
+    if cached and cached['expires_at'] > time.time() + TOKEN_EXPIRY_MARGIN:
+        return {'Authorization': build_login_token(response_json=cached)}
+
+    headers = {}
+    if not plenty_api_refresh_login(url=url, headers=headers):
         return None
-    return {'Authorization': token}
+    return headers
+
+
+def get_variation_page(url, headers, route, page, items_per_page):
+    """
+        Fetch a single page of a paginated variation route.
+
+        Parameter:
+            route [String]      : Variation route built by get_routes
+            page [Int]          : Number of the page (starting at 1)
+            items_per_page [Int]: Amount of entries per page
+
+        Return:
+            [Dict] : Response of the API, None on failure
+    """
+    page_route = route + str(f'&page={page}&itemsPerPage={items_per_page}')
+    return get_request_plenty_api(route=page_route, url=url, headers=headers)
+
 
-def plenty_api_get_variations(url, headers, config, scope):
+def iterate_variation_pages(url, headers, scope,
+                            items_per_page=DEFAULT_ITEMS_PER_PAGE,
+                            workers=DEFAULT_WORKERS, route=None,
+                            skip_pages=(), failed_pages=None, progress=None):
+    """
+        Read the first page of each route to learn the amount of pages and
+        entries, then fetch the remaining pages concurrently with a bounded
+        pool of workers. Every page is requested exactly once and the pages
+        are handed out in their original order, apart from the first pages
+        only a limited amount of pages is held in memory at the same time.
+
+        A page is identified by the index of its route and its page number,
+        which stays the same, when the first page of another route fails.
+
+        Parameter:
+            url [String]        : Base URL of the shop provided by the config
+            headers [Dict]      : HTTP header for the GET request
+            scope [Dict]        : User defined options about the breadth of
+                                  the data pull (see get_routes)
+            items_per_page [Int]: Amount of entries per page
+            workers [Int]       : Maximum amount of concurrent requests
+            route [String]      : Use this route instead of the ones built
+                                  from the scope
+            skip_pages [Set]    : Pages (route index, page number), which
+                                  are not requested (the first page of a
+                                  route is always requested)
+            failed_pages [List] : Receives the pages (route index, page
+                                  number) without a valid response (the
+                                  first page of a failed route stands for
+                                  the whole route)
+            progress [Progressbar]: Receives the total amount of entries,
+                                  before the first page is handed out
+
+        Yield:
+            [Tuple] : (total amount of entries of all routes,
+                       (route index, page number), entries of the page)
+    """
+    routes = [route] if route else get_routes(scope=scope)
+    if progress:
+        progress.start()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        first_pages = [
+            pool.submit(get_variation_page, url=url, headers=headers,
+                        route=route, page=1, items_per_page=items_per_page)
+            for route in routes]
+        first_pages = [future.result() for future in first_pages]
+        total = sum(response['totalsCount'] for response in first_pages
+                    if response)
+        if progress:
+            progress.count = total
+        for index, (route, response) in enumerate(zip(routes, first_pages)):
+            if not response:
+                if failed_pages is not None:
+                    failed_pages.append((index, 1))
+                continue
+            yield (total, (index, 1), response['entries'])
+
+            pages = iter([page for page in
+                          range(2, response['lastPageNumber'] + 1)
+                          if (index, page) not in skip_pages])
+            pending = collections.deque()
+            for page in itertools.islice(pages, workers * 2):
+                pending.append((page, pool.submit(
+                    get_variation_page, url=url, headers=headers,
+                    route=route, page=page, items_per_page=items_per_page)))
+            while pending:
+                page_number, future = pending.popleft()
+                page_response = future.result()
+                for page in itertools.islice(pages, 1):
+                    pending.append((page, pool.submit(
+                        get_variation_page, url=url, headers=headers,
+                        route=route, page=page,
+                        items_per_page=items_per_page)))
+                if not page_response:
+                    if failed_pages is not None:
+                        failed_pages.append((index, page_number))
+                    continue
+                yield (total, (index, page_number), page_response['entries'])
+
+
+def plenty_api_get_variations(url, headers, config, scope,
+                              items_per_page=DEFAULT_ITEMS_PER_PAGE,
+                              workers=DEFAULT_WORKERS, checkpoint=None,
+                              attributes=None, failed_pages=None):
     """
         Get the attribute ID and backend name from plentymarkets
         with incremental data from the API.
@@ -187,37 +550,72 @@ def plenty_api_get_variations(url, headers, config, scope):
                             data pull.
                             (name: {all, item, variation}),
                             (args: {item, variation})
+        items_per_page [Int]: Amount of variations per requested page
+        workers [Int]   : Maximum amount of concurrently requested pages
+        checkpoint [Checkpoint]: Optional record of the completed pages,
+                            restored pages are not requested again
+        attributes [List]: Attributes of the shop ({name, id}), requested
+                            from the API if not given
+        failed_pages [List]: Receives the pages without a valid response
+                            (see iterate_variation_pages)
     """
-    variation_list = []
-    columns = []
+    if attributes is None:
+        attributes = plenty_api_get_attribute_ids(url=url, headers=headers)
+    extractor = RowExtractor(attributes=attributes, config=config)
+
+    pages = dict(checkpoint.pages) if checkpoint else {}
+    offset = sum(checkpoint.entries.values()) if checkpoint else 0
+    get_progress().restore(done=offset)
+    for _, page, entries in iterate_variation_pages(
+            url=url, headers=headers, scope=scope,
+            items_per_page=items_per_page, workers=workers,
+            skip_pages=set(pages.keys()), failed_pages=failed_pages,
+            progress=get_progress()):
+        if page in pages:
+            continue
+        pages[page] = extractor.new_buffers()
+        extractor.extract(entries=entries, buffers=pages[page], offset=offset)
+        offset += len(entries)
+        if checkpoint:
+            checkpoint.add_page(page=page, buffers=pages[page],
+                                entries=len(entries))
+    get_progress().finish()
+    buffers = merge_buffers(pages=pages) or extractor.new_buffers()
+    return extractor.build_frame(buffers=buffers)
+
+
+def plenty_api_get_variation_ids(url, headers,
+                                 items_per_page=DEFAULT_ITEMS_PER_PAGE,
+                                 workers=DEFAULT_WORKERS):
+    """
+        Get the IDs of all existing (non-main) variations, without any
+        of the relations of the full variation request. The listing is only
+        complete, when every page was received.
+
+        Parameter:
+            url [String]        : Base URL of the shop provided by the config
+            headers [Dict]      : HTTP header for the GET request
+            items_per_page [Int]: Amount of variations per requested page
+            workers [Int]       : Maximum amount of concurrently requested pages
+
+        Return:
+            [Set] : Variation IDs, None if any page failed
+    """
+    variation_ids = set()
+    failed_pages = []
+    for _, _, entries in iterate_variation_pages(
+            url=url, headers=headers, scope=None,
+            items_per_page=items_per_page, workers=workers,
+            route='/rest/items/variations?isMain=false',
+            failed_pages=failed_pages):
+        variation_ids.update(entry['id'] for entry in entries
+                             if not entry['isMain'])
+    if failed_pages:
+        print("ERROR: Incomplete variation listing, failed pages: {0}"
+              .format(format_pages(pages=failed_pages)))
+        return None
+    return variation_ids
 
-    route = get_route(scope=scope)
-    response = get_request_plenty_api(route=route, url=url, headers=headers)
-    attributes = plenty_api_get_attribute_ids(url=url, headers=headers)
-    columns = build_columns(attr=attributes, config=config)
-
-    if not 'totalsCount' in response.keys():
-        # adjust the response of a single variation GET request
-        # in order to compute properly with the functions
-        response = {'entries':[response], 'lastPageNumber':1, 'page':1}
-        PROGRESS.count = 1
-    else:
-        PROGRESS.count = response['totalsCount']
-
-    for_each_entry_get_basic_data(entries=response['entries'],
-                                  dest=variation_list, config=config)
-    if response['lastPageNumber'] != response['page']:
-        loop_range = range(2, response['lastPageNumber'])
-        for page_num in loop_range:
-            route = route + str(f'&page={page_num}')
-            response = get_request_plenty_api(
-                route=route, url=url, headers=headers)
-            if not response:
-                continue
-            for_each_entry_get_basic_data(entries=response['entries'],
-                                          dest=variation_list, config=config)
-    frame = pandas.DataFrame(variation_list, columns=columns)
-    return frame
 
 def plenty_api_get_market_sku(url, headers, item, variation_id, config):
     """
@@ -236,59 +634,117 @@ def plenty_api_get_market_sku(url, headers, item, variation_id, config):
             [String] : Parent SKU used in the item.
     """
     route = str(f'/rest/items/{item}/variations/{variation_id}/variation_skus')
-    endpoint = url + route
-    raw_response = requests.get(endpoint, headers=headers)
-    response = raw_response.json()
+    response = get_request_plenty_api(route=route, url=url, headers=headers)
+    if response is None:
+        return 'Not found'
     return get_market_parent_sku(response=response, config=config)
 
-def plenty_api_get_childs_for_item(url, headers, item):
-    """
-        Get a list of children, that are bounded to a specific parent.
-
-        Parameter:
-            url [String]    : Base URL of the shop provided by the config
-            headers [Dict]  : HTTP header for the GET request
-            item [String]   : ID of the item (PlentyMarkets)
-
-        Return:
-            [List]
-    """
-    childs = []
-    route = str(f'/rest/items/{item}/variations')
-    endpoint = url + route
-    raw_response = requests.get(endpoint, headers=headers)
-    try:
-        response = raw_response.json()
-    except simplejson.errors.JSONDecodeError:
-        print(f'''ERROR: No response for request:
-              get child variation ids for ItemId: {item}''')
-        return childs
-
-    for entry in response['entries']:
-        if not entry['isMain']:
-            childs.append(entry['id'])
-    return childs
 
 def plenty_api_get_attribute_value_for_language(url, headers, value_id,
                                                 lang, signal):
     if not value_id:
         return ''
     route = str(f'/rest/items/attribute_values/{value_id}/names/{lang}')
-    endpoint = url + route
-    signal.emit_increment()
-    raw_response = requests.get(endpoint, headers=headers)
-    try:
-        response = raw_response.json()
-    except simplejson.errors.JSONDecodeError:
-        print(f'''ERROR: No response for request:
-              get value name for attributeValue: {value_id} in language: {lang}
-              ''')
+    if signal:
+        signal.increment()
+    response = get_request_plenty_api(route=route, url=url, headers=headers)
+    if response is None:
         return 'Not found'
 
     if not 'name' in response:
         return 'Not found'
     return response['name']
 
+
+def plenty_api_get_market_skus(url, headers, config, variations,
+                               workers=DEFAULT_WORKERS):
+    """
+        Get the parent SKU for multiple items concurrently.
+
+        Parameter:
+            url [String]    : Base URL of the shop provided by the config
+            headers [Dict]  : HTTP header for the GET request
+            config [Dict]   : Config mapping of values used in
+                              the plentymarkets client
+            variations [Dict]: Mapping of item ID to one of its variation IDs
+            workers [Int]   : Maximum amount of concurrent requests
+
+        Return:
+            [Dict] : Mapping of item ID to parent SKU
+    """
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            item: pool.submit(plenty_api_get_market_sku, url=url,
+                              headers=headers, item=item,
+                              variation_id=variation_id, config=config)
+            for item, variation_id in variations.items()
+        }
+    return {item: future.result() for item, future in futures.items()}
+
+
+def plenty_api_get_attribute_value_names(url, headers, pairs, signal=None,
+                                         workers=DEFAULT_WORKERS):
+    """
+        Get the names of multiple attribute values in multiple languages
+        concurrently.
+
+        Parameter:
+            url [String]        : Base URL of the shop provided by the config
+            headers [Dict]      : HTTP header for the GET request
+            pairs [List]        : (value ID, language) tuples
+            signal [Progressbar]: Optional progress indicator
+            workers [Int]       : Maximum amount of concurrent requests
+
+        Return:
+            [Dict] : Mapping of (value ID, language) to name
+    """
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            (value_id, lang): pool.submit(
+                plenty_api_get_attribute_value_for_language, url=url,
+                headers=headers, value_id=value_id, lang=lang, signal=signal)
+            for value_id, lang in pairs
+        }
+    return {pair: future.result() for pair, future in futures.items()}
+
+
+def plenty_api_get_attribute_value_dictionary(
+        url, headers, attribute_id, langs,
+        items_per_page=DEFAULT_ITEMS_PER_PAGE, workers=DEFAULT_WORKERS):
+    """
+        Get every value of an attribute together with its names, with
+        paginated bulk requests instead of one request per value and
+        language.
+
+        Parameter:
+            url [String]        : Base URL of the shop provided by the config
+            headers [Dict]      : HTTP header for the GET request
+            attribute_id [Int]  : ID of the attribute
+            langs [List]        : Languages of the translation
+            items_per_page [Int]: Amount of values per page
+            workers [Int]       : Maximum amount of concurrent requests
+
+        Return:
+            [Dict] : Mapping of (value ID, language) to name, values without
+                     a name in a language are 'Not found'
+    """
+    route = str(f'/rest/items/attributes/{attribute_id}/values?with=names')
+    names = {}
+    for _, _, entries in iterate_variation_pages(
+            url=url, headers=headers, scope=None,
+            items_per_page=items_per_page, workers=workers, route=route):
+        for entry in entries:
+            if 'id' not in entry:
+                continue
+            value_names = {
+                name['lang']: name['name'] for name in
+                entry.get('valueNames') or entry.get('names') or []}
+            for lang in langs:
+                names[(int(entry['id']), lang)] = value_names.get(
+                    lang, 'Not found')
+    return names
+
+
 def plenty_api_get_attribute_ids(url, headers):
     attributes = []
     response = get_request_plenty_api(route='/rest/items/attributes', url=url,
@@ -301,13 +757,3 @@ def plenty_api_get_attribute_ids(url, headers):
                            'id': attribute['id']})
 
     return attributes
-
-def plenty_api_get_itemid_for_variation(url, headers, variation):
-    route = str(f'/rest/items/variations?id={variation}')
-    response = get_request_plenty_api(route=route, url=url,
-                                      headers=headers)
-    if not response:
-        return 0
-    if response['entries']:
-        return response['entries'][0]['itemId']
-    return 0
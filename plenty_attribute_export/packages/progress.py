@@ -1,36 +1,155 @@
+"""
+    Author: Sebastian Fricke (Panasiam)
+    Date: 2020-07-30
+    License: GPLv3
+
+    Progress indicator for long running parts of the export, which can be
+    updated from multiple threads and asyncio tasks at the same time.
+"""
 import sys
+import threading
 import time
-import signalslot
+
+# Seconds between two redraws on a terminal and two summary lines otherwise
+TTY_INTERVAL = 0.2
+LOG_INTERVAL = 10.0
+
+
+def format_duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return str(f"{hours}:{minutes:02d}:{seconds:02d}")
+
 
 class Progressbar():
-    def __init__(self, size, prefix):
+    """
+        Count the finished units of work and show the progress with the
+        throughput and the estimated remaining time. The output is redrawn
+        at most every `interval` seconds, instead of on every update. When
+        the output is not a terminal (log files, cron), a one-line summary
+        is written periodically instead of the bar.
+
+        Parameter:
+            size [Int]          : Width of the bar in characters
+            prefix [String]     : Text in front of the bar
+            unit [String]       : Name of the counted units
+            file [File]         : Output stream, stdout by default
+            interval [Float]    : Minimum seconds between two redraws
+    """
+    def __init__(self, size, prefix, unit='items', file=None, interval=None):
         self.size = size
         self.prefix = prefix
-        self.count = 1
-        self.file = sys.stdout
-        self.signal = signalslot.Signal(args=['index'])
-        self.signal.connect(self.show)
-        self.index = 0
-
-    def show(self, index, **kwargs):
-        index += 1
-        x = int(self.size*index/self.count)
-        self.file.write("%s[%s%s] %i/%i   \r" % (self.prefix,
-                                                 "#"*x, "."*(self.size-x),
-                                                 index, self.count))
-        self.file.flush()
+        self.unit = unit
+        self.file = file or sys.stdout
+        try:
+            self.tty = self.file.isatty()
+        except (AttributeError, ValueError):
+            self.tty = False
+        if interval is None:
+            interval = TTY_INTERVAL if self.tty else LOG_INTERVAL
+        self.interval = interval
+        self.lock = threading.Lock()
+        self._count = 1
+        self.done = 0
+        # units finished by a previous run, not part of the throughput
+        self.restored = 0
+        self.started = None
+        self.last_draw = 0.0
+        self.finished = False
 
-        if index != self.count:
-            return
+    @property
+    def count(self):
+        """ Total amount of units, setting it starts the clock. """
+        return self._count
 
-        self.file.write("\n")
-        self.file.flush()
+    @count.setter
+    def count(self, value):
+        with self.lock:
+            self._count = value
+            self._start()
+
+    def start(self):
+        """ Start the clock of the throughput, before the total is known. """
+        with self.lock:
+            self._start()
 
-    def emit(self, index):
-        self.signal.emit(index=index)
+    def _start(self):
+        if self.started is None:
+            self.started = time.monotonic()
+            self.last_draw = self.started
 
-    def emit_increment(self):
-        self.signal.emit(index=self.index)
-        self.index += 1
-        if self.count == self.index:
-            self.index = 0
+    def restore(self, done):
+        """
+            Count units finished by a previous (interrupted) run, without
+            adding them to the throughput.
+
+            Parameter:
+                done [Int] : Restored units
+        """
+        with self.lock:
+            self.restored += done
+            self.done += done
+
+    def update(self, done):
+        """
+            Set the amount of finished units (for sequential work, where
+            the position is known).
+
+            Parameter:
+                done [Int] : Finished units
+        """
+        with self.lock:
+            self.done = max(self.done, done)
+            self._refresh()
+
+    def increment(self, amount=1):
+        """
+            Add finished units, safe to call from concurrent workers.
+
+            Parameter:
+                amount [Int] : Newly finished units
+        """
+        with self.lock:
+            self.done += amount
+            self._refresh()
+
+    def finish(self):
+        """ Draw the final state, if it was not drawn yet. """
+        with self.lock:
+            if self.started is not None and not self.finished:
+                self._draw(now=time.monotonic(), final=True)
+
+    def _refresh(self):
+        # the total was never set, measure from the first update
+        self._start()
+        now = time.monotonic()
+        if self.done >= self.count:
+            if not self.finished:
+                self._draw(now=now, final=True)
+        elif now - self.last_draw >= self.interval:
+            self._draw(now=now, final=False)
+
+    def _draw(self, now, final):
+        self.last_draw = now
+        done = min(self.done, self.count)
+        elapsed = max(now - self.started, 1e-6)
+        rate = (self.done - self.restored) / elapsed
+        if final:
+            self.finished = True
+            remaining = str(f"in {format_duration(elapsed)}")
+        elif rate:
+            remaining = str(
+                f"ETA {format_duration((self.count - done) / rate)}")
+        else:
+            remaining = 'ETA -:--:--'
+        status = str(f"{done}/{self.count} {rate:.1f} {self.unit}/s "
+                     f"{remaining}")
+        if self.tty:
+            filled = int(self.size * done / max(self.count, 1))
+            self.file.write("\r{0}[{1}{2}] {3}   {4}".format(
+                self.prefix, "#" * filled, "." * (self.size - filled), status,
+                "\n" if final else ""))
+        else:
+            percent = 100 * done / max(self.count, 1)
+            self.file.write(str(f"{self.prefix} {percent:.0f}% {status}\n"))
+        self.file.flush()
@@ -0,0 +1,137 @@
+"""
+    Author: Sebastian Fricke (Panasiam)
+    Date: 2020-07-30
+    License: GPLv3
+
+    Keep the request rate below the call limits of the PlentyMarkets API.
+    Exceeding the limits leads to throttling and in the worst case to a
+    locked account.
+"""
+import threading
+import time
+
+# Prefixes of the (limit, calls left, seconds until reset) header triples
+CALL_LIMIT_HEADERS = (
+    'X-Plenty-Global-Short-Period',
+    'X-Plenty-Global-Long-Period',
+    'X-Plenty-Route'
+)
+# Share of a period's limit, below which the requests are slowed down
+SLOWDOWN_RATIO = 0.5
+
+
+class CallLimiter():
+    """
+        Adaptive throttle shared by every request to the same shop.
+
+        Once less than SLOWDOWN_RATIO of a call limit is left, the
+        remaining budget of the period is spread evenly over the time
+        until the period resets. When only the reserve is left, further
+        requests are paused until the period is over.
+        Concurrent requests are sent before the responses of the previous
+        ones arrive, so every sent request is taken from the budget right
+        away and each response only accounts the requests sent before it.
+
+        Parameter:
+            reserve [Int] : Calls, which are never used up by the export
+    """
+    def __init__(self, reserve=2):
+        self.reserve = reserve
+        self.lock = threading.Lock()
+        self.interval = 0.0
+        self.next_slot = 0.0
+        # Calls left until the reset of the period (None while unknown),
+        # the calls and the length of a new period
+        self.budget = None
+        self.reset_at = 0.0
+        self.period_budget = None
+        self.period = 0.0
+        self.sent = 0
+        self.waited = 0.0
+        self.pauses = 0
+
+    def acquire(self):
+        """
+            Reserve the next request slot. While the calls of the period are
+            used up, no slot is reserved, as the period only restarts with
+            the first request after the reset.
+
+            Return:
+                [Tuple] : Seconds to wait and the ticket of the reserved
+                          request (see update), without a ticket ask again
+                          after waiting
+        """
+        with self.lock:
+            now = time.monotonic()
+            if self.budget is not None and now >= self.reset_at:
+                self.budget = self.period_budget
+                self.reset_at = now + self.period
+            if self.budget is not None and self.budget <= 0:
+                delay = self.reset_at - now
+                self.waited += delay
+                self.pauses += 1
+                return (delay, 0)
+            if self.budget is not None:
+                self.budget -= 1
+            start = max(now, self.next_slot)
+            self.next_slot = start + self.interval
+            self.sent += 1
+            delay = start - now
+            if delay > 0:
+                self.waited += delay
+                self.pauses += 1
+        return (delay, self.sent)
+
+    def wait(self):
+        """
+            Block the calling thread until the next request is allowed.
+
+            Return:
+                [Int] : Ticket of the request (see update)
+        """
+        while True:
+            delay, ticket = self.acquire()
+            if delay:
+                time.sleep(delay)
+            if ticket:
+                return ticket
+
+    def update(self, headers, ticket=0):
+        """
+            Adjust the pace to the call limit headers of a response.
+
+            Parameter:
+                headers [Dict]  : Headers of the HTTP response
+                ticket [Int]    : Ticket of the answered request, the
+                                  requests sent after it are not counted
+                                  within the headers yet
+        """
+        with self.lock:
+            sent_after = max(self.sent - ticket, 0) if ticket else 0
+        interval = 0.0
+        limiting = None
+        for prefix in CALL_LIMIT_HEADERS:
+            try:
+                calls_left = int(headers[prefix + '-Calls-Left'])
+                decay = int(headers[prefix + '-Decay'])
+                limit = int(headers.get(prefix + '-Limit', 0))
+            except (KeyError, TypeError, ValueError):
+                continue
+            calls_left -= sent_after
+            if limiting is None or calls_left < limiting[0]:
+                limiting = (calls_left, decay, limit)
+            if calls_left > self.reserve and\
+                    (not limit or calls_left < limit * SLOWDOWN_RATIO):
+                interval = max(interval, decay / (calls_left - self.reserve))
+        with self.lock:
+            self.interval = interval
+            if limiting:
+                calls_left, decay, limit = limiting
+                self.budget = calls_left - self.reserve
+                self.reset_at = time.monotonic() + decay
+                self.period = max(self.period, decay)
+                self.period_budget = limit - self.reserve if limit else None
+
+    def summary(self):
+        return str(f"Rate limit: waited {self.waited:.1f}s "
+                   f"({self.pauses} pauses)")
@@ -0,0 +1,154 @@
+"""
+    Author: Sebastian Fricke (Panasiam)
+    Date: 2020-07-30
+    License: GPLv3
+
+    Run the exports of multiple configuration profiles (e.g. one per
+    PlentyMarkets system) at the same time. Every profile is exported in
+    its own process with its own session, token, call limiter and output,
+    while a shared semaphore caps the concurrent requests of all profiles.
+"""
+import multiprocessing
+import os
+import queue
+import sys
+import traceback
+
+import plenty_attribute_export.packages.client as cl
+import plenty_attribute_export.packages.metrics as mt
+
+# Seconds between two checks for finished or crashed profile processes
+POLL_INTERVAL = 0.5
+
+
+def profile_name(path):
+    """
+        Parameter:
+            path [String] : Location of the configuration file
+
+        Return:
+            [String] : File name of the profile without the extension
+    """
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def run_profile(export, name, argv, log_path, slots, results):
+    """
+        Entry point of a profile process, run the export with the given
+        command line arguments and report the timings of the run.
+
+        Parameter:
+            export [Function]   : Command line interface (cli.cli)
+            name [String]       : Name of the profile
+            argv [List]         : Command line arguments of the export
+            log_path [String]   : The output of the export is written to
+                                  this file
+            slots [Semaphore]   : Shared limit of concurrent requests
+            results [Queue]     : Receives the summary of the run
+    """
+    status = 0
+    with open(log_path, mode='w', buffering=1) as log:
+        sys.stdout = log
+        sys.stderr = log
+        cl.share_request_slots(slots)
+        mt.METRICS.enabled = True
+        sys.argv = ['plenty_attribute_export'] + argv
+        try:
+            export()
+        except SystemExit as err:
+            if isinstance(err.code, int):
+                status = err.code
+            else:
+                status = 0 if err.code is None else 1
+        except Exception:
+            traceback.print_exc()
+            status = 1
+        summary = mt.METRICS.totals()
+    summary.update({'name': name, 'status': status})
+    results.put(summary)
+
+
+def run_profiles(export, profiles, max_requests):
+    """
+        Start the export of every profile in a separate process and wait
+        for all of them to finish.
+
+        Parameter:
+            export [Function]   : Command line interface (cli.cli)
+            profiles [List]     : Dictionaries with the name, the command
+                                  line arguments (argv) and the location of
+                                  the log file (log) of each profile
+            max_requests [Int]  : Maximum amount of concurrent requests of
+                                  all profiles together
+
+        Return:
+            [List] : Summary of each profile (see Metrics.totals), with the
+                     exit status of its export (-1 for a crashed process)
+    """
+    # spawn: the children must not inherit the connections of this process
+    context = multiprocessing.get_context('spawn')
+    slots = context.BoundedSemaphore(max_requests)
+    results = context.Queue()
+    processes = {}
+    for profile in profiles:
+        process = context.Process(
+            target=run_profile, name=profile['name'],
+            kwargs={'export': export, 'name': profile['name'],
+                    'argv': profile['argv'], 'log_path': profile['log'],
+                    'slots': slots, 'results': results})
+        process.start()
+        processes[profile['name']] = process
+        print(f"Started the export of {profile['name']} "
+              f"(log: {profile['log']})")
+
+    summaries = {}
+    while len(summaries) < len(processes):
+        try:
+            summary = results.get(timeout=POLL_INTERVAL)
+        except queue.Empty:
+            if any(process.is_alive() for process in processes.values()):
+                continue
+            # every process exited, collect the remaining reports
+            try:
+                summary = results.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                break
+        summaries[summary['name']] = summary
+        print(f"Finished the export of {summary['name']} "
+              f"(status {summary['status']})")
+    for process in processes.values():
+        process.join()
+
+    return [summaries.get(profile['name'], {
+        'name': profile['name'], 'status': -1, 'wall_time': 0.0,
+        'phases': {}, 'requests': 0, 'retries': 0, 'errors': 0})
+            for profile in profiles]
+
+
+def format_summary(summaries, wall_time):
+    """
+        Parameter:
+            summaries [List]    : Result of run_profiles
+            wall_time [Float]   : Seconds of the complete run
+
+        Return:
+            [String] : Table of the timings per profile
+    """
+    lines = [str(f"{'profile':<20}{'status':>7}{'wall':>9}{'requests':>10}"
+                 f"{'retries':>8}{'errors':>7}  slowest phase")]
+    for summary in summaries:
+        if summary['phases']:
+            phase, duration = max(summary['phases'].items(),
+                                  key=lambda phase: phase[1])
+            slowest = str(f"{phase} {duration:.2f}s")
+        else:
+            slowest = '-'
+        status = 'ok' if summary['status'] == 0 else str(summary['status'])
+        lines.append(str(
+            f"{summary['name']:<20}{status:>7}"
+            f"{summary['wall_time']:>8.2f}s{summary['requests']:>10}"
+            f"{summary['retries']:>8}{summary['errors']:>7}  {slowest}"))
+    serial = sum(summary['wall_time'] for summary in summaries)
+    lines.append(str(f"Total wall time {wall_time:.2f}s (sum of the "
+                     f"profiles {serial:.2f}s)"))
+    return '\n'.join(lines)
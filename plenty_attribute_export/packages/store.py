@@ -0,0 +1,238 @@
+"""
+    Author: Sebastian Fricke (Panasiam)
+    Date: 2020-07-30
+    License: GPLv3
+
+    Local SQLite store of the exported variations, their attribute values
+    and the translated value names. The store is updated in place by every
+    export with the store option and answers lookups (e.g. which variations
+    use an attribute value) without any request to the API.
+"""
+import sqlite3
+import time
+
+from plenty_attribute_export.packages.cache import SQLITE_TIMEOUT
+
+
+def attribute_names(columns):
+    """
+        Find the attributes within the columns of an export, every
+        attribute has a `<name>_name` and a `<name>_id` column.
+
+        Parameter:
+            columns [List] : Columns of the export
+
+        Return:
+            [List] : Names of the attributes
+    """
+    return [column[:-len('_id')] for column in columns
+            if column.endswith('_id') and
+            column[:-len('_id')] + '_name' in columns]
+
+
+def translation_columns(columns, attribute, langs):
+    """
+        Return:
+            [Dict] : Mapping of language to the translation column of the
+                     attribute (see translation.expand_columns)
+    """
+    if len(langs) == 1:
+        return {langs[0]: str(f"{attribute}_lang")}
+    return {lang: str(f"{attribute}_{lang}") for lang in langs
+            if str(f"{attribute}_{lang}") in columns}
+
+
+def optional_int(value):
+    return int(value) if value != '' else None
+
+
+class ExportStore():
+    """
+        SQLite store keyed by the shop URL, like the attribute cache, so
+        that a single file can hold the exports of multiple systems.
+
+        Parameter:
+            path [String]   : Location of the SQLite file
+            url [String]    : Base URL of the shop provided by the config
+    """
+    def __init__(self, path, url):
+        self.url = url
+        self.connection = sqlite3.connect(path, timeout=SQLITE_TIMEOUT)
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS variations (
+                url TEXT NOT NULL,
+                variation_id INTEGER NOT NULL,
+                variation_number TEXT,
+                item_id INTEGER,
+                parent_sku TEXT,
+                exported_at REAL NOT NULL,
+                PRIMARY KEY (url, variation_id)
+            );
+            CREATE INDEX IF NOT EXISTS variations_number
+                ON variations (url, variation_number);
+            CREATE INDEX IF NOT EXISTS variations_item
+                ON variations (url, item_id);
+            CREATE INDEX IF NOT EXISTS variations_parent_sku
+                ON variations (url, parent_sku);
+            CREATE TABLE IF NOT EXISTS variation_values (
+                url TEXT NOT NULL,
+                variation_id INTEGER NOT NULL,
+                attribute TEXT NOT NULL,
+                value_id INTEGER NOT NULL,
+                backend_name TEXT,
+                PRIMARY KEY (url, variation_id, attribute)
+            );
+            CREATE INDEX IF NOT EXISTS variation_values_value
+                ON variation_values (url, value_id);
+            CREATE TABLE IF NOT EXISTS value_names (
+                url TEXT NOT NULL,
+                value_id INTEGER NOT NULL,
+                lang TEXT NOT NULL,
+                name TEXT NOT NULL,
+                PRIMARY KEY (url, value_id, lang)
+            );
+        """)
+
+    def update(self, frame, langs, exported_at=None):
+        """
+            Insert or replace the variations of an export (or a chunk of a
+            streamed export), the attribute values of these variations are
+            replaced completely.
+
+            Parameter:
+                frame [DataFrame]   : Export data (see RowExtractor)
+                langs [List]        : Languages of the translation columns
+                exported_at [Float] : UNIX timestamp of the export
+
+            Return:
+                [Int] : Amount of stored variations
+        """
+        if frame.empty:
+            return 0
+        from plenty_attribute_export.packages.plentyapi import frame_to_text
+        exported_at = exported_at or time.time()
+        columns = list(frame.columns)
+        attributes = attribute_names(columns=columns)
+        text = frame_to_text(frame)
+        variations = []
+        values = []
+        names = {}
+        for row in text.to_dict(orient='records'):
+            variation_id = int(row['variation-id'])
+            variations.append((
+                self.url, variation_id, row['variation-number'],
+                optional_int(row['item-id']), row['parent-variation'],
+                exported_at))
+            for attribute in attributes:
+                value_id = optional_int(row[str(f"{attribute}_id")])
+                if value_id is None:
+                    continue
+                values.append((self.url, variation_id, attribute, value_id,
+                               row[str(f"{attribute}_name")]))
+                for lang, column in translation_columns(
+                        columns=columns, attribute=attribute,
+                        langs=langs).items():
+                    if row[column] and row[column] != 'Not found':
+                        names[(value_id, lang)] = row[column]
+        with self.connection:
+            self.connection.executemany(
+                """DELETE FROM variation_values
+                   WHERE url = ? AND variation_id = ?""",
+                [(self.url, variation[1]) for variation in variations])
+            self.connection.executemany(
+                """INSERT OR REPLACE INTO variations
+                   (url, variation_id, variation_number, item_id, parent_sku,
+                    exported_at) VALUES (?, ?, ?, ?, ?, ?)""", variations)
+            self.connection.executemany(
+                """INSERT OR REPLACE INTO variation_values
+                   (url, variation_id, attribute, value_id, backend_name)
+                   VALUES (?, ?, ?, ?, ?)""", values)
+            self.connection.executemany(
+                """INSERT OR REPLACE INTO value_names
+                   (url, value_id, lang, name) VALUES (?, ?, ?, ?)""",
+                [(self.url, value_id, lang, name)
+                 for (value_id, lang), name in names.items()])
+        return len(variations)
+
+    def remove_older(self, exported_at):
+        """
+            Delete the variations, which were not part of a complete export
+            (scope all) started at the given time.
+
+            Return:
+                [Int] : Amount of deleted variations
+        """
+        with self.connection:
+            self.connection.execute(
+                """DELETE FROM variation_values WHERE url = ? AND
+                   variation_id IN (SELECT variation_id FROM variations
+                                    WHERE url = ? AND exported_at < ?)""",
+                (self.url, self.url, exported_at))
+            return self.connection.execute(
+                """DELETE FROM variations WHERE url = ? AND exported_at < ?""",
+                (self.url, exported_at)).rowcount
+
+    def find_variations(self, key, value):
+        """
+            Look up variations with their attribute values, for a value ID
+            only the matching attribute value of each variation is listed.
+
+            Parameter:
+                key [String]    : variation_id/variation_number/item_id/
+                                  parent_sku/value_id
+                value [String]  : Searched value
+
+            Return:
+                [List] : Tuples of (variation ID, variation number, item ID,
+                         parent SKU, attribute, value ID, backend name)
+        """
+        if key == 'value_id':
+            condition = 'variation_values.value_id = ?'
+        elif key in ('variation_id', 'variation_number', 'item_id',
+                     'parent_sku'):
+            condition = str(f'variations.{key} = ?')
+        else:
+            raise ValueError(str(f"unknown lookup key {key}"))
+        return self.connection.execute(str(f"""
+            SELECT variations.variation_id, variations.variation_number,
+                   variations.item_id, variations.parent_sku,
+                   variation_values.attribute, variation_values.value_id,
+                   variation_values.backend_name
+            FROM variations LEFT JOIN variation_values
+                ON variation_values.url = variations.url
+                AND variation_values.variation_id = variations.variation_id
+            WHERE variations.url = ? AND {condition}
+            ORDER BY variations.variation_id, variation_values.attribute"""),
+            (self.url, value)).fetchall()
+
+    def value_names(self, value_ids, langs=None):
+        """
+            Parameter:
+                value_ids [List]    : Attribute value IDs
+                langs [List]        : Optional languages, all by default
+
+            Return:
+                [Dict] : Mapping of (value ID, language) to name
+        """
+        names = {}
+        for value_id in value_ids:
+            for found_id, lang, name in self.connection.execute(
+                    """SELECT value_id, lang, name FROM value_names
+                       WHERE url = ? AND value_id = ? ORDER BY lang""",
+                    (self.url, int(value_id))):
+                if not langs or lang in langs:
+                    names[(found_id, lang)] = name
+        return names
+
+    def summary(self):
+        """
+            Return:
+                [Tuple] : Amount of stored variations and the UNIX timestamp
+                          of the latest export
+        """
+        return self.connection.execute(
+            """SELECT COUNT(*), MAX(exported_at) FROM variations
+               WHERE url = ?""", (self.url,)).fetchone()
+
+    def close(self):
+        self.connection.close()
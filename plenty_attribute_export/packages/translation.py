@@ -0,0 +1,196 @@
+"""
+    Author: Sebastian Fricke (Panasiam)
+    Date: 2020-07-30
+    License: GPLv3
+
+    Resolve the translations of attribute values with as few requests
+    to the PlentyMarkets API as possible.
+"""
+import plenty_attribute_export.packages.plentyapi as pa
+import plenty_attribute_export.packages.checkpoint as cp
+
+
+class TranslationResolver():
+    """
+        Fetch the name of every unique attribute value ID only once per
+        language and keep the result in memory for the rest of the run.
+
+        Parameter:
+            url [String]    : Base URL of the shop provided by the config
+            headers [Dict]  : HTTP header for the GET request
+                              (has to contain atleast authorization)
+            cache [ValueCache]: Optional persistent cache, consulted
+                              before any request is made
+            api [Module]    : Engine used for the requests (plentyapi or
+                              asyncapi)
+            workers [Int]   : Maximum amount of concurrent requests
+            checkpoint [Checkpoint]: Optional record of resolved names, the
+                              names restored from it are not requested
+    """
+    def __init__(self, url, headers, cache=None, api=pa,
+                 workers=pa.DEFAULT_WORKERS, checkpoint=None):
+        self.url = url
+        self.headers = headers
+        self.cache = cache
+        self.api = api
+        self.workers = workers
+        self.checkpoint = checkpoint
+        self.memo = dict(checkpoint.names) if checkpoint else {}
+
+    def prefetch(self, attributes, langs,
+                 items_per_page=pa.DEFAULT_ITEMS_PER_PAGE, workers=None):
+        """
+            Download the complete value lists of the selected attributes
+            with their names, so that resolve only has to request the
+            values missing from these lists. The amount of requests
+            depends on the amount of attribute values instead of the amount
+            of variations. Attributes, whose lists are completely stored
+            in the persistent cache, are skipped.
+
+            Parameter:
+                attributes [List]   : Selected attributes ({name, id})
+                langs [List]        : Languages of the translation
+                items_per_page [Int]: Amount of values per page
+                workers [Int]       : Concurrent page requests, defaults to
+                                      the workers of the resolver
+
+            Return:
+                [Int] : Amount of prefetched names
+        """
+        prefetched = 0
+        for attribute in attributes:
+            wanted = [lang for lang in langs if not self.cache or
+                      not self.cache.has_value_dictionary(
+                          attribute_id=attribute['id'], lang=lang)]
+            if not wanted:
+                continue
+            # few paginated requests, the threaded engine is sufficient
+            fetched = pa.plenty_api_get_attribute_value_dictionary(
+                url=self.url, headers=self.headers,
+                attribute_id=attribute['id'], langs=wanted,
+                items_per_page=items_per_page,
+                workers=workers or self.workers)
+            self.memo.update(fetched)
+            prefetched += len(fetched)
+            if self.checkpoint:
+                self.checkpoint.add_names(names=fetched)
+            if not self.cache:
+                continue
+            for lang in wanted:
+                names = {value_id: name for (value_id, name_lang), name
+                         in fetched.items() if name_lang == lang}
+                self.cache.set_value_names(names=names, lang=lang)
+                self.cache.set_value_dictionary(
+                    attribute_id=attribute['id'], lang=lang)
+        return prefetched
+
+    def resolve(self, value_ids, langs, signal=None):
+        """
+            Get the translated names for each of the given value IDs,
+            only values unknown to the memo and the persistent cache are
+            requested from the API. The missing names of all languages
+            are fetched within a single batch.
+
+            Parameter:
+                value_ids [Iterable]    : Attribute value IDs, empty
+                                          values are ignored
+                langs [List]            : Languages of the translation
+                signal [Progressbar]    : Optional progress indicator
+
+            Return:
+                [Dict] : Mapping of language to a mapping of value ID
+                         to translated name
+        """
+        import pandas
+        unique_ids = {int(value_id) for value_id in value_ids
+                      if not pandas.isna(value_id) and value_id != ''}
+        missing = {}
+        for lang in langs:
+            missing[lang] = [value_id for value_id in sorted(unique_ids)
+                             if (value_id, lang) not in self.memo]
+            if self.cache and missing[lang]:
+                cached = self.cache.get_value_names(value_ids=missing[lang],
+                                                    lang=lang)
+                for value_id, name in cached.items():
+                    self.memo[(value_id, lang)] = name
+                missing[lang] = [value_id for value_id in missing[lang]
+                                 if value_id not in cached]
+        pairs = [(value_id, lang) for lang in langs
+                 for value_id in missing[lang]]
+        if signal and pairs:
+            signal.count = len(pairs)
+        for start in range(0, len(pairs), cp.BATCH_SIZE):
+            batch = pairs[start:start + cp.BATCH_SIZE]
+            fetched = self.api.plenty_api_get_attribute_value_names(
+                url=self.url, headers=self.headers, pairs=batch,
+                signal=signal, workers=self.workers)
+            self.memo.update(fetched)
+            if self.checkpoint:
+                self.checkpoint.add_names(names=fetched)
+            if self.cache:
+                for lang in langs:
+                    names = {value_id: name for (value_id, name_lang), name
+                             in fetched.items() if name_lang == lang}
+                    if names:
+                        self.cache.set_value_names(names=names, lang=lang)
+        return {lang: {value_id: self.memo[(value_id, lang)]
+                       for value_id in unique_ids} for lang in langs}
+
+    def apply(self, frame, attributes, langs, signal=None):
+        """
+            Fill the translation columns of every selected attribute, with
+            a single deduplicated lookup across all attribute columns and
+            languages. A single language is written to the `_lang` column,
+            multiple languages replace it with one `_<lang>` column each.
+
+            Parameter:
+                frame [DataFrame]   : pandas DataFrame of the variations
+                attributes [List]   : Selected attributes ({name, id})
+                langs [List]        : Languages of the translation
+                signal [Progressbar]: Optional progress indicator
+        """
+        id_columns = [str(f"{attribute['name']}_id")
+                      for attribute in attributes]
+        if not id_columns:
+            return
+        import pandas
+        value_ids = pandas.unique(frame[id_columns].values.ravel())
+        translations = self.resolve(value_ids=value_ids, langs=langs,
+                                    signal=signal)
+        for attribute in attributes:
+            lang_column = str(f"{attribute['name']}_lang")
+            value_column = frame[str(f"{attribute['name']}_id")]
+            if len(langs) == 1:
+                frame[lang_column] = value_column.map(
+                    translations[langs[0]]).fillna('').astype('category')
+                continue
+            position = frame.columns.get_loc(lang_column)
+            del frame[lang_column]
+            for index, lang in enumerate(langs):
+                frame.insert(position + index,
+                             str(f"{attribute['name']}_{lang}"),
+                             value_column.map(translations[lang])
+                             .fillna('').astype('category'))
+
+
+def expand_columns(columns, langs):
+    """
+        Get the columns of the export after the translation, see
+        TranslationResolver.apply.
+
+        Parameter:
+            columns [List]  : Columns built by plentyapi.build_columns
+            langs [List]    : Languages of the translation
+
+        Return:
+            [List]
+    """
+    if len(langs) == 1:
+        return columns
+    expanded = []
+    for column in columns:
+        if column.endswith('_lang'):
+            expanded += [column[:-len('lang')] + lang for lang in langs]
+        else:
+            expanded.append(column)
+    return expanded
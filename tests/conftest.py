@@ -0,0 +1,107 @@
+"""
+    Fixtures for the end-to-end tests, which run the complete `cli()`
+    against the local mock server (see benchmarks/mock_server.py).
+"""
+import os
+import sys
+import keyring
+import keyring.backend
+import keyring.backends.fail
+import keyring.errors
+import pytest
+
+import plenty_attribute_export.cli as cli
+import plenty_attribute_export.packages.client as cl
+import plenty_attribute_export.packages.plentyapi as pa
+from benchmarks.mock_server import start_server
+from benchmarks.bench_end_to_end import write_config
+
+ATTRIBUTES = 3
+
+
+class MemoryKeyring(keyring.backend.KeyringBackend):
+    """ Keyring backend, that keeps the passwords of a single test. """
+    priority = 1
+
+    def __init__(self):
+        super().__init__()
+        self.passwords = {}
+
+    def get_password(self, service, username):
+        return self.passwords.get((service, username))
+
+    def set_password(self, service, username, password):
+        self.passwords[(service, username)] = password
+
+    def delete_password(self, service, username):
+        if (service, username) not in self.passwords:
+            raise keyring.errors.PasswordDeleteError(username)
+        del self.passwords[(service, username)]
+
+
+@pytest.fixture
+def server():
+    server = start_server(items=20, variations=4, attributes=ATTRIBUTES,
+                          values=20)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def config(server, tmp_path):
+    """ Configuration file of the mock server within a temporary folder. """
+    return write_config(directory=str(tmp_path), url=server.url,
+                        attributes=ATTRIBUTES)
+
+
+@pytest.fixture
+def run(config, monkeypatch):
+    """
+        Run the export with the given command line arguments (headless,
+        without the attribute cache) and return the exit status.
+    """
+    # never touch the keyring of the user with tokens of the mock server
+    keyring.set_keyring(keyring.backends.fail.Keyring())
+    monkeypatch.setenv('PLENTY_USERNAME', 'test')
+    monkeypatch.setenv('PLENTY_PASSWORD', 'test')
+    for name in ('CONFIG_FILE', 'CACHE_FILE', 'STATE_FILE', 'STORE_FILE'):
+        monkeypatch.setattr(cli, name, getattr(cli, name))
+    monkeypatch.setattr(cl, 'CLIENT_SETTINGS', dict(cl.CLIENT_SETTINGS))
+    monkeypatch.setattr(cl, 'CLIENTS', {})
+    monkeypatch.setattr(sys, 'stdout', sys.stdout)
+
+    def export(*argv, query=False):
+        if query:
+            argv = ['query', '--config-file', config] + list(argv)
+        else:
+            argv = ['--headless', '--config-file', config,
+                    '--no-cache'] + list(argv)
+        monkeypatch.setattr(sys, 'argv', ['plenty_attribute_export'] + argv)
+        # every run of the command line starts with a new progress bar
+        pa.PROGRESS = None
+        try:
+            cli.cli()
+        except SystemExit as err:
+            return err.code or 0
+        return 0
+
+    yield export
+    pa.PROGRESS = None
+    if 'plenty_attribute_export.packages.asyncapi' in sys.modules:
+        sys.modules['plenty_attribute_export.packages.asyncapi']\
+            .close_runners()
+
+
+@pytest.fixture
+def folder(config):
+    return os.path.dirname(config)
+
+
+@pytest.fixture
+def memory_keyring(run):
+    """ Keep the tokens of the mock server between the runs of a test. """
+    backend = MemoryKeyring()
+    keyring.set_keyring(backend)
+    yield backend
+    keyring.set_keyring(keyring.backends.fail.Keyring())
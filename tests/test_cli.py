@@ -0,0 +1,324 @@
+"""
+    End-to-end tests of the export and the query command against the local
+    mock server.
+"""
+import os
+import sqlite3
+import pandas
+import pytest
+
+import plenty_attribute_export.cli as cli
+import plenty_attribute_export.packages.plentyapi as pa
+import plenty_attribute_export.packages.store as st
+from benchmarks.mock_server import PRIMARY_MARKET
+
+
+@pytest.fixture(params=['sync', 'async'])
+def engine(request):
+    if request.param == 'async':
+        pytest.importorskip('aiohttp')
+    return request.param
+
+
+def child_ids(server):
+    return sorted(variation['id'] for variation in server.catalogue.variations
+                  if not variation['isMain'])
+
+
+def read_csv(path):
+    return pandas.read_csv(path, sep=';', dtype=str, keep_default_na=False)
+
+
+def remove_item(server, item):
+    catalogue = server.catalogue
+    catalogue.variations = [variation for variation in catalogue.variations
+                            if variation['itemId'] != item]
+    catalogue.by_id = {variation['id']: variation
+                       for variation in catalogue.variations}
+
+
+def test_export_all(run, server, folder, engine):
+    output = os.path.join(folder, 'all.csv')
+    assert run('-s', 'all', '--engine', engine, '--items-per-page', '10',
+               '--output', output) == 0
+
+    frame = read_csv(output)
+    assert [int(value) for value in frame['variation-id']] ==\
+        child_ids(server)
+    row = frame.iloc[0]
+    variation = server.catalogue.by_id[int(row['variation-id'])]
+    assert row['parent-variation'] ==\
+        str(f"P{variation['itemId']}-{PRIMARY_MARKET}")
+    value = server.catalogue.values[int(row['attribute1_id'])]
+    assert row['attribute1_name'] == value['backendName']
+    assert row['attribute1_lang'] == str(f"{value['backendName']} (en)")
+    assert pa.PROGRESS.done == pa.PROGRESS.count == 100
+
+
+def test_item_scope_sets_the_progress_total_once(run, folder, engine):
+    output = os.path.join(folder, 'item.csv')
+    assert run('-s', 'item', '-i', '1,2,3', '--engine', engine,
+               '--output', output) == 0
+
+    assert len(read_csv(output).index) == 12
+    assert pa.PROGRESS.count == 15
+    assert pa.PROGRESS.done == 15
+
+
+@pytest.mark.parametrize('scope', [['-s', 'all'],
+                                   ['-s', 'item', '-i', '1,2,3,4,5,6']])
+def test_error_responses_without_retries(run, server, folder, engine, scope):
+    server.error_rate = 0.3
+    output = os.path.join(folder, 'errors.csv')
+    arguments = scope + ['--engine', engine, '--retries', '0',
+                         '--items-per-page', '5', '--output', output]
+    status = run(*arguments)
+
+    if status != 0:
+        # nothing is written for an incomplete export, resume fills the gaps
+        assert status == 1
+        assert not os.path.exists(output)
+        server.error_rate = 0.0
+        assert run(*arguments, '--resume') == 0
+    frame = read_csv(output)
+    expected = [variation for variation in child_ids(server)
+                if scope[1] == 'all' or
+                server.catalogue.by_id[variation]['itemId'] <= 6]
+    assert [int(value) for value in frame['variation-id']] == expected
+    assert 'attribute1_id' in frame.columns
+
+
+def test_incremental_export_keeps_the_column_types(run, folder):
+    pytest.importorskip('pyarrow')
+    assert run('--incremental', '--output',
+               os.path.join(folder, 'first.csv')) == 0
+    output = os.path.join(folder, 'merged.parquet')
+    assert run('--incremental', '-f', 'parquet', '--output', output) == 0
+
+    frame = pandas.read_parquet(output)
+    assert len(frame.index) == 80
+    assert str(frame['variation-id'].dtype) == 'Int64'
+    assert str(frame['attribute1_id'].dtype) == 'Int64'
+    assert str(frame['item-id'].dtype) == 'Int64'
+    assert str(frame['parent-variation'].dtype) == 'category'
+    assert str(frame['attribute1_lang'].dtype) == 'category'
+
+
+def test_incremental_export_only_requests_the_changes(run, server, folder):
+    assert run('--incremental', '--output',
+               os.path.join(folder, 'first.csv')) == 0
+    server.catalogue.touch(item=3)
+    changed = [variation for variation in server.catalogue.variations
+               if variation['itemId'] == 3 and not variation['isMain']]
+    for variation in changed:
+        variation['number'] = str(f"changed-{variation['id']}")
+    server.reset_counts()
+
+    output = os.path.join(folder, 'second.csv')
+    assert run('--incremental', '--output', output) == 0
+    assert server.counts['GET /rest/items/variations'] == 1
+    frame = read_csv(output)
+    assert [int(value) for value in frame['variation-id']] ==\
+        child_ids(server)
+    numbers = dict(zip(frame['variation-id'], frame['variation-number']))
+    assert all(numbers[str(variation['id'])] == variation['number']
+               for variation in server.catalogue.variations
+               if not variation['isMain'])
+
+
+def test_incremental_export_detects_deletions_on_request(run, server, folder):
+    assert run('--incremental', '--output',
+               os.path.join(folder, 'first.csv')) == 0
+    remove_item(server=server, item=20)
+
+    output = os.path.join(folder, 'kept.csv')
+    assert run('--incremental', '--output', output) == 0
+    assert len(read_csv(output).index) == 80
+
+    output = os.path.join(folder, 'removed.csv')
+    assert run('--incremental', '--detect-deletions', '--output',
+               output) == 0
+    frame = read_csv(output)
+    assert [int(value) for value in frame['variation-id']] ==\
+        child_ids(server)
+
+
+def test_failed_id_listing_keeps_the_previous_state(run, folder,
+                                                    monkeypatch):
+    assert run('--incremental', '--output',
+               os.path.join(folder, 'first.csv')) == 0
+    state_path = os.path.join(folder, '.plenty_export_state.json')
+    with open(state_path, mode='r') as state_file:
+        state = state_file.read()
+
+    get_variation_page = pa.get_variation_page
+
+    def failing_listing(route, page, **kwargs):
+        if 'isMain=false' in route and page == 2:
+            return None
+        return get_variation_page(route=route, page=page, **kwargs)
+
+    monkeypatch.setattr(pa, 'get_variation_page', failing_listing)
+    output = os.path.join(folder, 'second.csv')
+    assert run('--incremental', '--detect-deletions', '--items-per-page',
+               '10', '--output', output) == 1
+
+    assert not os.path.exists(output)
+    with open(state_path, mode='r') as state_file:
+        assert state_file.read() == state
+
+
+def test_failed_stream_keeps_the_stored_variations(run, server, folder,
+                                                   monkeypatch):
+    assert run('--store', '--stream', '--output',
+               os.path.join(folder, 'first.csv')) == 0
+    # let the stored variations look like the result of an earlier export
+    with sqlite3.connect(cli.STORE_FILE) as connection:
+        connection.execute('UPDATE variations SET exported_at = 0')
+    connection.close()
+
+    get_variation_page = pa.get_variation_page
+
+    def failing_listing(route, page, **kwargs):
+        if page == 2:
+            return None
+        return get_variation_page(route=route, page=page, **kwargs)
+
+    monkeypatch.setattr(pa, 'get_variation_page', failing_listing)
+    assert run('--store', '--stream', '--items-per-page', '10', '--output',
+               os.path.join(folder, 'second.csv')) == 1
+
+    store = st.ExportStore(path=cli.STORE_FILE, url=server.url)
+    assert store.summary()[0] == len(child_ids(server))
+    store.close()
+
+
+def test_resume_counts_the_restored_pages(run, server, folder, engine,
+                                          monkeypatch):
+    extract = pa.RowExtractor.extract
+    calls = []
+
+    def interrupted(self, *args, **kwargs):
+        calls.append(None)
+        if len(calls) == 3:
+            raise RuntimeError('interrupted')
+        return extract(self, *args, **kwargs)
+
+    monkeypatch.setattr(pa.RowExtractor, 'extract', interrupted)
+    output = os.path.join(folder, 'resumed.csv')
+    arguments = ['--engine', engine, '--items-per-page', '10', '-w', '1',
+                 '--output', output]
+    with pytest.raises(RuntimeError):
+        run(*arguments)
+    monkeypatch.setattr(pa.RowExtractor, 'extract', extract)
+    assert run(*arguments, '--resume') == 0
+
+    frame = read_csv(output)
+    assert [int(value) for value in frame['variation-id']] ==\
+        child_ids(server)
+    assert pa.PROGRESS.restored == 20
+    assert pa.PROGRESS.done == pa.PROGRESS.count == 100
+
+
+def test_async_download_checkpoints_every_arrived_page(run, server, folder,
+                                                       monkeypatch):
+    asyncapi = pytest.importorskip(
+        'plenty_attribute_export.packages.asyncapi')
+    get_json = asyncapi.AsyncPlentyClient.get_json
+    calls = []
+
+    async def interrupted(self, route, headers):
+        calls.append(route)
+        if len(calls) == 4:
+            raise RuntimeError('interrupted')
+        return await get_json(self, route=route, headers=headers)
+
+    monkeypatch.setattr(asyncapi.AsyncPlentyClient, 'get_json', interrupted)
+    output = os.path.join(folder, 'resumed.csv')
+    arguments = ['--engine', 'async', '--items-per-page', '10',
+                 '--max-inflight', '1', '--output', output]
+    with pytest.raises(RuntimeError):
+        run(*arguments)
+    monkeypatch.setattr(asyncapi.AsyncPlentyClient, 'get_json', get_json)
+    assert run(*arguments, '--resume') == 0
+
+    frame = read_csv(output)
+    assert [int(value) for value in frame['variation-id']] ==\
+        child_ids(server)
+    assert pa.PROGRESS.restored == 30
+    assert pa.PROGRESS.done == pa.PROGRESS.count == 100
+
+
+def test_store_answers_queries(run, server, folder, capsys):
+    assert run('--store', '--output', os.path.join(folder, 'store.csv')) == 0
+    variation = server.catalogue.by_id[child_ids(server)[0]]
+    value_id = variation['variationAttributeValues'][0]['valueId']
+    expected = {
+        entry['id'] for entry in server.catalogue.variations
+        if not entry['isMain'] and
+        entry['variationAttributeValues'][0]['valueId'] == value_id}
+    capsys.readouterr()
+
+    assert run('--value', str(value_id), '--tsv', query=True) == 0
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0].split('\t')[:2] == ['variation-id', 'variation-number']
+    assert {int(line.split('\t')[0]) for line in lines[1:]} == expected
+
+    assert run('--name', str(value_id), '--tsv', query=True) == 0
+    lines = capsys.readouterr().out.splitlines()
+    name = server.catalogue.values[value_id]['backendName']
+    assert lines[1:] == [str(f"{value_id}\ten\t{name} (en)")]
+
+    assert run('--name', 'abc', query=True) == 2
+    assert run('--variation', 'abc', query=True) == 2
+
+
+@pytest.mark.parametrize('option', ['-w', '--max-inflight', '--items-per-page',
+                                    '--pool-size', '--max-requests'])
+@pytest.mark.parametrize('value', ['0', '-1', 'abc'])
+def test_concurrency_options_require_a_positive_integer(run, option, value):
+    assert run(option, value) == 2
+
+
+def test_rejected_token_is_dropped_after_a_failed_login(run, server, folder,
+                                                       memory_keyring,
+                                                       monkeypatch):
+    assert run('--output', os.path.join(folder, 'first.csv')) == 0
+    assert memory_keyring.passwords
+    # the API revoked every token and the credentials stopped working
+    server.tokens.clear()
+    server.refresh_tokens.clear()
+    monkeypatch.setattr(pa, 'request_login', lambda url, keyring: '')
+
+    assert run('--output', os.path.join(folder, 'second.csv')) == 1
+    assert not memory_keyring.passwords
+
+
+def test_rejected_token_is_refreshed(run, server, folder, engine,
+                                     memory_keyring):
+    assert run('--engine', engine, '--output',
+               os.path.join(folder, 'first.csv')) == 0
+    # the access token expired at the API before its announced expiry
+    server.tokens.clear()
+    server.reset_counts()
+
+    output = os.path.join(folder, 'second.csv')
+    assert run('--engine', engine, '--output', output) == 0
+    assert server.counts['POST /rest/login/refresh'] == 1
+    assert 'POST /rest/login' not in server.counts
+    assert [int(value) for value in read_csv(output)['variation-id']] ==\
+        child_ids(server)
+
+
+def test_requests_stay_within_the_call_limit(run, server, folder, engine):
+    server.call_limit = 12
+    server.decay = 1
+    server.reset_counts()
+    output = os.path.join(folder, 'limited.csv')
+    assert run('--engine', engine, '--retries', '0', '--items-per-page', '5',
+               '--output', output) == 0
+
+    assert sum(server.counts.values()) > server.call_limit
+    assert server.rejected == 0
+    assert [int(value) for value in read_csv(output)['variation-id']] ==\
+        child_ids(server)